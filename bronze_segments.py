@@ -0,0 +1,106 @@
+# bronze_segments.py
+# Rolled NDJSON segments for bronze order streams: many orders per file
+# instead of one tiny JSON file per order. Also reads the gzip segments
+# produced by compact_bronze.py.
+import os, json, glob, gzip, time, threading, itertools
+from datetime import datetime
+
+SEGMENT_GLOB = "segment-*.ndjson"
+MANIFEST_SUFFIX = ".manifest.json"   # written by compact_bronze.py
+_seq = itertools.count()          # unique segment names within this process
+
+def segment_name():
+    ts = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    return f"segment-{ts}-{os.getpid()}-{next(_seq):05d}.ndjson"
+
+class SegmentWriter:
+    """Append records to <root>/<partition>/segment-*.ndjson. A segment is
+    rolled once it reaches max_bytes or is older than max_seconds. Safe to
+    share between threads."""
+
+    def __init__(self, root, max_bytes=64*1024*1024, max_seconds=300, flush=False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.flush = flush             # flush each write so live readers see it
+        self._open = {}                # partition -> (file, path, opened_at)
+        self._lock = threading.Lock()
+
+    def _segment(self, partition):
+        f, path, opened = self._open.get(partition, (None, None, 0))
+        if f is not None and (not os.path.exists(path)
+                              or f.tell() >= self.max_bytes
+                              or time.time() - opened >= self.max_seconds):
+            f.close()
+            f = None
+        if f is None:
+            folder = os.path.join(self.root, partition)
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, segment_name())
+            f = open(path, "a")
+            self._open[partition] = (f, path, time.time())
+        return f
+
+    def write(self, record, partition):
+        self.write_lines(json.dumps(record) + "\n", partition)
+
+    def write_lines(self, text, partition):
+        """Append a block of already-serialised NDJSON lines"""
+        with self._lock:
+            f = self._segment(partition)
+            f.write(text)
+            if self.flush:
+                f.flush()
+
+    def close(self):
+        with self._lock:
+            for f, _, _ in self._open.values():
+                f.close()
+            self._open.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def iter_segment(path):
+    """Yield records of a segment (plain or .gz) in write order. A trailing
+    line without a newline is still being written and is skipped."""
+    with (gzip.open(path, "rt") if path.endswith(".gz") else open(path)) as fp:
+        for line in fp:
+            if line.endswith("\n") and line.strip():
+                yield json.loads(line)
+
+def read_records(path):
+    """One record per legacy .json file, or a whole segment streamed line by line"""
+    if path.endswith((".ndjson", ".ndjson.gz")):
+        return iter_segment(path)
+    with open(path) as fp:
+        return [json.load(fp)]
+
+def is_covered(path, sources):
+    """True if a manifest's sources (name -> mtime) hold this exact file
+    version; a file rewritten after compaction is not covered."""
+    mtime = sources.get(os.path.basename(path))
+    return mtime is not None and os.path.getmtime(path) == mtime
+
+def manifests(folder):
+    """(compacted segment paths, merged sources name -> mtime) of a folder"""
+    segments, sources = [], {}
+    for m in sorted(glob.glob(os.path.join(folder, "*" + MANIFEST_SUFFIX))):
+        with open(m) as fp:
+            manifest = json.load(fp)
+        segments.append(os.path.join(folder, manifest["segment"]))
+        sources.update(manifest["sources"])
+    return segments, sources
+
+def live_files(folder, patterns):
+    """Files to read from a bronze folder: the compacted segments named by its
+    manifests first, then loose files that have not been compacted yet.
+    Compacted segments without a manifest (interrupted compaction) and files
+    already listed in a manifest (deletion pending) are ignored."""
+    segments, sources = manifests(folder)
+    loose = {f for p in patterns for f in glob.glob(os.path.join(folder, p))
+             if not f.endswith(MANIFEST_SUFFIX) and not is_covered(f, sources)}
+    return segments + sorted(loose)
@@ -1,38 +1,240 @@
 # bronze_to_silver.py
-import os, json, glob
+import os, io, json, glob, time, hashlib, argparse, threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-from datetime import datetime
+import storage
+from storage import read_silver, write_silver, table_exists, partition_dates
+from bronze_segments import read_records, live_files, manifests
 
 BRONZE = "woeat_demo/bronze"
-SILVER = "woeat_demo/silver"
+SILVER = storage.SILVER
 os.makedirs(SILVER, exist_ok=True)
 
-def load_orders():
-    rows=[]
-    for f in glob.glob("woeat_demo/bronze*/orders_stream/*/*.json"):
-        with open(f) as fp:
-            rec=json.load(fp)
-        rows.append({
-            "order_id":      rec["order_id"],
-            "customer_id":   rec["customer_id"],
-            "restaurant_id": rec["restaurant_id"],
-            "driver_id":     rec["driver_id"],
-            "items":         ",".join(rec["items"]),
-            "status":        rec["status"],
-            "order_time":    pd.to_datetime(rec["order_time"]),
-            "delivery_time": pd.to_datetime(rec.get("delivery_time")),
-            "ingest_timestamp": datetime.utcfromtimestamp(os.path.getmtime(f))
-        })
-    df=pd.DataFrame(rows)
-    df.to_csv(f"{SILVER}/silver_orders.csv", index=False)
-    print("✓ silver_orders.csv written")
-
-def load_restaurant_perf():
-    df=pd.read_csv(f"{BRONZE}/restaurant_reports/restaurant_perf.csv",
-                   parse_dates=["report_date"])
+CHECKPOINT = f"{SILVER}/_checkpoint.json"
+CHECKPOINT_LOCK = threading.Lock()      # loaders may run side by side (pipeline.py)
+# later statuses win when the same order_id shows up more than once
+STATUS_ORDER = {"PLACED": 0, "DELIVERED": 1}
+
+# --- file checkpoint: path -> size, mtime, sha1 of the version last parsed ---
+def load_checkpoint():
+    if not os.path.exists(CHECKPOINT):
+        return {}
+    with open(CHECKPOINT) as fp:
+        return json.load(fp)
+
+def save_checkpoint(kind, entries):
+    with CHECKPOINT_LOCK:
+        cp = load_checkpoint()
+        cp[kind] = entries
+        tmp = CHECKPOINT + ".tmp"
+        with open(tmp, "w") as fp:
+            json.dump(cp, fp)
+        os.replace(tmp, CHECKPOINT)
+
+def file_hash(f):
+    h = hashlib.sha1()
+    with open(f, "rb") as fp:
+        for block in iter(lambda: fp.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def scan(files, seen):
+    """Return (files to parse, new checkpoint entries). Unchanged size+mtime is
+    trusted; otherwise the content hash decides (touch without change)."""
+    changed, entries = [], {}
+    for f in files:
+        st = os.stat(f)
+        old = seen.get(f)
+        if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime:
+            entries[f] = old
+            continue
+        entries[f] = {"size": st.st_size, "mtime": st.st_mtime, "sha1": file_hash(f)}
+        if not old or old["sha1"] != entries[f]["sha1"]:
+            changed.append(f)
+    return changed, entries
+
+def lost_files(seen, entries):
+    """Tracked files that are gone without having been compacted away (e.g. the
+    live folder was reset); their rows can only be dropped by a full rebuild."""
+    gone = [f for f in seen if f not in entries]
+    return [f for f in gone if os.path.basename(f) not in manifests(os.path.dirname(f))[1]]
+
+def incremental(kind, files, table, full):
+    """Return (files to parse, whether to merge into the existing silver table
+    rather than rebuild it, checkpoint entries to save afterwards)"""
+    seen = {} if full else load_checkpoint().get(kind, {})
+    changed, entries = scan(files, seen)
+    if full or not table_exists(table) or lost_files(seen, entries):
+        return files, False, entries
+    return changed, True, entries
+
+# --- orders ---
+def order_files():
+    # per partition: compacted segment first, then loose files in name order so
+    # that later segments (status updates) come last
+    return [f for folder in sorted(glob.glob("woeat_demo/bronze*/orders_stream/*/"))
+            for f in live_files(folder, ["*.json", "*.ndjson"])]
+
+ORDER_COLUMNS = ["order_id","customer_id","restaurant_id","driver_id","items",
+                 "status","order_time","delivery_time","ingest_timestamp"]
+
+def chunks(files, n):
+    """Split files into n contiguous chunks so arrival order survives the pool"""
+    size = -(-len(files) // n) or 1
+    return [files[i:i+size] for i in range(0, len(files), size)]
+
+def parse_parallel(parse_chunk, files, columns, workers):
+    """Run parse_chunk over the file list, in-process or on a process pool, and
+    concatenate the returned column lists in file order"""
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(parse_chunk, chunks(files, workers*4)))
+    else:
+        parts = [parse_chunk(files)]
+    return {c: [v for p in parts for v in p[c]] for c in columns}
+
+def to_utc(values):
+    return pd.to_datetime(pd.Series(values, dtype=object), utc=True, format="ISO8601")
+
+def to_ingest(epochs):
+    # rounds like datetime.utcfromtimestamp: whole seconds + round(fraction*1e6)
+    frac, whole = np.modf(np.asarray(epochs, dtype=float))
+    us = whole.astype("int64")*1_000_000 + np.round(frac*1e6).astype("int64")
+    return pd.to_datetime(us, unit="us")
+
+def append_order(cols, rec, mtime):
+    """Add one bronze order record to the column lists, timestamps left as text"""
+    cols["order_id"].append(rec["order_id"])
+    cols["customer_id"].append(rec["customer_id"])
+    cols["restaurant_id"].append(rec["restaurant_id"])
+    cols["driver_id"].append(rec["driver_id"])
+    cols["items"].append(rec["items"])
+    cols["status"].append(rec["status"])
+    cols["order_time"].append(rec["order_time"])
+    cols["delivery_time"].append(rec.get("delivery_time"))
+    # compacted records carry the mtime of the file they were first written to
+    cols["ingest_timestamp"].append(rec.get("_source_mtime") or mtime)
+
+def parse_order_chunk(files):
+    """Worker: column lists for a chunk of order files"""
+    cols = {c: [] for c in ORDER_COLUMNS}
+    for f in files:
+        mtime = os.path.getmtime(f)
+        for rec in read_records(f):
+            append_order(cols, rec, mtime)
+    return cols
+
+def order_frame(cols):
+    """Typed silver order rows from append_order column lists"""
+    df = pd.DataFrame(cols, columns=ORDER_COLUMNS)
+    df["items"] = storage.encode_lists(df["items"], "item_id")
+    df["order_time"] = to_utc(df["order_time"])
+    df["delivery_time"] = to_utc(df["delivery_time"])
+    df["ingest_timestamp"] = to_ingest(df["ingest_timestamp"])
+    return df
+
+def parse_orders(files, workers=1):
+    return order_frame(parse_parallel(parse_order_chunk, files, ORDER_COLUMNS, workers))
+
+def merge_orders(old, new):
+    """Upsert by order_id. Rows are ordered by status progression first and
+    arrival second, so a PLACED->DELIVERED update replaces the older row and a
+    re-parsed older file cannot roll an order back."""
+    df = pd.concat([old, new], ignore_index=True) if old is not None else new
+    rank = df["status"].astype(str).map(STATUS_ORDER).fillna(0)
+    df = df.iloc[rank.argsort(kind="stable")]
+    return df.drop_duplicates("order_id", keep="last").sort_index().reset_index(drop=True)
+
+def load_orders(full=False, workers=1):
+    # a table from before the item_id dictionary is re-encoded by rewriting it
+    full = full or storage.legacy_lists("silver_orders")
+    files, merge, entries = incremental("orders", order_files(), "silver_orders", full)
+    if merge and not files:
+        save_checkpoint("orders", entries)
+        print("✓ silver_orders up to date")
+        return
+    new = parse_orders(files, workers)
+    old = None
+    if merge:
+        # status updates keep their order_time, so only these partitions can change
+        old = read_silver("silver_orders", dates=set(partition_dates(new, "silver_orders")))
+    df = merge_orders(old, new)
+    write_silver(df, "silver_orders", replace=not merge)
+    if not merge:
+        # tells silver_to_gold that rows may have gone and a full rebuild is due
+        save_checkpoint("orders_rebuilt", time.time())
+    save_checkpoint("orders", entries)
+    print(f"✓ silver_orders written ({len(files)} bronze files parsed)")
+
+# --- restaurant reports: base CSV plus late reports appended by the live simulator ---
+REPORT_KEY = ["report_date","restaurant_id"]
+
+def report_files():
+    # bronze/ sorts before bronze_live/, so late corrections are applied last
+    return sorted(glob.glob("woeat_demo/bronze*/restaurant_reports/*.csv"))
+
+def window_hash(fp, offset, size=4096):
+    """sha1 of the bytes just before offset; changes if the file was rewritten"""
+    fp.seek(max(0, offset - size))
+    return hashlib.sha1(fp.read(offset - max(0, offset - size))).hexdigest()
+
+def read_tail(f, state):
+    """Rows appended to a report CSV since the byte offset kept in `state`.
+    Starts over if the file was replaced, truncated or rewritten in place. A
+    partial last line is left for the next run. Returns (rows, new state)."""
+    st = os.stat(f)
+    with open(f, "rb") as fp:
+        if (state and state["ino"] == st.st_ino and state["offset"] <= st.st_size
+                and window_hash(fp, state["offset"]) == state["tail_sha1"]):
+            header, offset = state["header"], state["offset"]
+        else:
+            fp.seek(0)
+            line = fp.readline()
+            if not line.endswith(b"\n"):
+                return pd.DataFrame(), None
+            header, offset = line.decode().strip().split(","), len(line)
+        fp.seek(offset)
+        chunk = fp.read()
+        chunk = chunk[:chunk.rfind(b"\n") + 1]
+        offset += len(chunk)
+        state = {"ino": st.st_ino, "offset": offset, "header": header,
+                 "tail_sha1": window_hash(fp, offset)}
+    if not chunk:
+        return pd.DataFrame(), state
+    return pd.read_csv(io.BytesIO(chunk), names=header, parse_dates=["report_date"]), state
+
+def load_restaurant_perf(full=False):
+    """Read only the tail of each report CSV and upsert by (report_date,
+    restaurant_id). A report file that disappeared forces a rebuild."""
+    files = report_files()
+    seen = {} if full else load_checkpoint().get("reports", {})
+    merge = (not full and table_exists("silver_restaurant_performance")
+             and all(f in files for f in seen))
+    if not merge:
+        seen = {}
+    frames, entries = [], {}
+    for f in files:
+        rows, state = read_tail(f, seen.get(f))
+        if state:
+            entries[f] = state
+        if len(rows):
+            frames.append(rows)
+    if merge and not frames:
+        save_checkpoint("reports", entries)
+        print("✓ silver_restaurant_performance up to date")
+        return
+    if not frames:
+        # no report rows at all (e.g. the live CSV was reset away): an empty table
+        frames = [pd.DataFrame(columns=list(storage.SCHEMAS["silver_restaurant_performance"]))]
+    df = pd.concat(frames, ignore_index=True)
     df["ingest_timestamp"]=pd.Timestamp.utcnow()
-    df.to_csv(f"{SILVER}/silver_restaurant_performance.csv", index=False)
-    print("✓ silver_restaurant_performance.csv written")
+    if merge:
+        df = pd.concat([read_silver("silver_restaurant_performance"), df], ignore_index=True)
+    df = df.drop_duplicates(REPORT_KEY, keep="last").reset_index(drop=True)
+    write_silver(df, "silver_restaurant_performance")
+    save_checkpoint("reports", entries)
+    print(f"✓ silver_restaurant_performance written ({sum(map(len, frames))} new report rows)")
 
 def load_menu_items():
     frames=[]
@@ -40,34 +242,79 @@ def load_menu_items():
         frames.append(pd.read_json(f))
     df=pd.concat(frames, ignore_index=True)
     df["ingest_timestamp"]=pd.Timestamp.utcnow()
-    df.to_csv(f"{SILVER}/silver_menu_items.csv", index=False)
-    print("✓ silver_menu_items.csv written")
+    write_silver(df, "silver_menu_items")
+    print("✓ silver_menu_items written")
 
 def load_drivers():
     df=pd.read_csv(f"{BRONZE}/drivers/drivers_2024-04-01.csv")
     df["ingest_timestamp"]=pd.Timestamp.utcnow()
-    df.to_csv(f"{SILVER}/silver_drivers.csv", index=False)
-    print("✓ silver_drivers.csv written")
-
-def load_weather():
-    rows=[]
-    for f in glob.glob(f"{BRONZE}/weather_api/*.json"):
-        zone=f.split("_")[1]           # weather_Z1_20240401_00.json
-        with open(f) as fp:
-            rec=json.load(fp)
-        rows.append({
-            "zone":zone,
-            "weather_time":pd.to_datetime(rec["weather_time"]),
-            "temperature":rec["temperature"],
-            "condition":rec["condition"],
-            "ingest_timestamp": datetime.utcfromtimestamp(os.path.getmtime(f))
-        })
-    pd.DataFrame(rows).to_csv(f"{SILVER}/silver_weather.csv", index=False)
-    print("✓ silver_weather.csv written")
+    write_silver(df, "silver_drivers")
+    print("✓ silver_drivers written")
+
+WEATHER_COLUMNS = ["zone","weather_time","temperature","condition","ingest_timestamp"]
+
+def parse_weather_chunk(files):
+    cols = {c: [] for c in WEATHER_COLUMNS}
+    for f in files:
+        mtime = os.path.getmtime(f)
+        for rec in read_records(f):
+            # loose files: weather_Z1_20240401_00.json; compacted records carry zone
+            cols["zone"].append(rec.get("zone") or os.path.basename(f).split("_")[1])
+            cols["weather_time"].append(rec["weather_time"])
+            cols["temperature"].append(rec["temperature"])
+            cols["condition"].append(rec["condition"])
+            cols["ingest_timestamp"].append(rec.get("_source_mtime") or mtime)
+    return cols
+
+def parse_weather(files, workers=1):
+    df = pd.DataFrame(parse_parallel(parse_weather_chunk, files, WEATHER_COLUMNS, workers))
+    df["weather_time"] = to_utc(df["weather_time"])
+    df["ingest_timestamp"] = to_ingest(df["ingest_timestamp"])
+    return df
+
+def load_weather(full=False, workers=1):
+    files, merge, entries = incremental(
+        "weather", live_files(f"{BRONZE}/weather_api", ["weather_*_*_*.json"]), "silver_weather", full)
+    if merge and not files:
+        save_checkpoint("weather", entries)
+        print("✓ silver_weather up to date")
+        return
+    df = parse_weather(files, workers)
+    if merge:
+        df = (pd.concat([read_silver("silver_weather"), df], ignore_index=True)
+              .drop_duplicates(["zone","weather_time"], keep="last"))
+    write_silver(df, "silver_weather")
+    save_checkpoint("weather", entries)
+    print(f"✓ silver_weather written ({len(files)} bronze files parsed)")
+
+def benchmark(workers):
+    """Parse every order file serially and on the pool; print the speedup"""
+    files = order_files()
+    t0 = time.perf_counter(); serial = parse_orders(files, 1)
+    t1 = time.perf_counter(); parallel = parse_orders(files, workers)
+    t2 = time.perf_counter()
+    assert serial.equals(parallel), "parallel parse differs from serial"
+    print(f"{len(files)} files, {len(serial)} orders")
+    print(f"  serial     : {t1-t0:7.2f}s")
+    print(f"  {workers} workers  : {t2-t1:7.2f}s  ({(t1-t0)/(t2-t1):.2f}x)")
 
 if __name__=="__main__":
-    load_orders()
-    load_restaurant_perf()
+    ap = argparse.ArgumentParser(description="Bronze -> silver")
+    ap.add_argument("--full", action="store_true",
+                    help="ignore the file checkpoint and reparse all bronze files")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="processes used to parse order and weather files")
+    ap.add_argument("--benchmark", action="store_true",
+                    help="compare serial and --workers parsing of all order files, write nothing")
+    ap.add_argument("--csv", action="store_true",
+                    help="also export every silver table as CSV")
+    args = ap.parse_args()
+    storage.EXPORT_CSV = storage.EXPORT_CSV or args.csv
+    if args.benchmark:
+        benchmark(max(args.workers, 2))
+        raise SystemExit
+    load_orders(args.full, args.workers)
+    load_restaurant_perf(args.full)
     load_menu_items()
     load_drivers()
-    load_weather()
+    load_weather(args.full, args.workers)
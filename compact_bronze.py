@@ -0,0 +1,108 @@
+# compact_bronze.py
+# Roll each bronze partition's small files into one gzip NDJSON segment:
+#   orders_stream/<day>/*.json|*.ndjson        -> orders-<ts>.ndjson.gz
+#   weather_api/weather_<zone>_<day>_<hh>.json -> weather_<day>-<ts>.ndjson.gz
+# The swap is: write segment (tmp + rename), then atomically replace the
+# partition manifest, then delete the originals. Readers
+# (bronze_segments.live_files) trust only the manifest, so a crash at any
+# point leaves either the old or the new view, never a partial one.
+import os, json, glob, gzip, time, argparse
+from collections import defaultdict
+from datetime import datetime
+from bronze_segments import read_records, is_covered, MANIFEST_SUFFIX
+
+BRONZE_ROOTS = "woeat_demo/bronze*"
+
+def write_atomic_json(path, obj):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f, indent=1)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def compact_partition(folder, name, sources, zone_from_name=False):
+    """Compact `sources` (paths inside `folder`) into one segment named after
+    `name`. Records keep the mtime of the file they came from as
+    `_source_mtime` so silver ingest timestamps do not move."""
+    manifest_path = os.path.join(folder, name + MANIFEST_SUFFIX)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as fp:
+            old = json.load(fp)
+        sources = [os.path.join(folder, old["segment"])] + sources
+
+    segment = f"{name}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}.ndjson.gz"
+    tmp = os.path.join(folder, segment + ".tmp")
+    records, mtimes = 0, {}
+    with gzip.open(tmp, "wt") as out:
+        for src in sources:
+            mtime = mtimes[os.path.basename(src)] = os.path.getmtime(src)
+            for rec in read_records(src):
+                rec.setdefault("_source_mtime", mtime)
+                if zone_from_name:
+                    rec.setdefault("zone", os.path.basename(src).split("_")[1])
+                out.write(json.dumps(rec) + "\n")
+                records += 1
+    os.replace(tmp, os.path.join(folder, segment))
+
+    write_atomic_json(manifest_path, {
+        "segment": segment,
+        "sources": mtimes,          # name -> mtime of the version compacted
+        "records": records,
+        "compacted_at": datetime.utcnow().isoformat() + "Z",
+    })
+    for src in sources:                       # only after the manifest swap
+        os.remove(src)
+    return records
+
+def is_cold(files, min_age):
+    return all(time.time() - os.path.getmtime(f) >= min_age for f in files)
+
+def uncompacted(folder, name, files):
+    """Drop files the partition manifest already covers; leftovers of an
+    interrupted delete step are removed here."""
+    manifest = os.path.join(folder, name + MANIFEST_SUFFIX)
+    if not os.path.exists(manifest):
+        return sorted(files)
+    with open(manifest) as fp:
+        sources = json.load(fp)["sources"]
+    loose = []
+    for f in sorted(files):
+        if is_covered(f, sources):
+            os.remove(f)
+        else:
+            loose.append(f)
+    return loose
+
+def compact_orders(min_age):
+    done = 0
+    for folder in sorted(glob.glob(f"{BRONZE_ROOTS}/orders_stream/*/")):
+        loose = uncompacted(folder, "orders",
+                            [f for p in ("*.json", "*.ndjson") for f in glob.glob(os.path.join(folder, p))
+                             if not f.endswith(MANIFEST_SUFFIX)])
+        if loose and is_cold(loose, min_age):
+            n = compact_partition(folder, "orders", loose)
+            print(f"✓ {folder}: {len(loose)} files -> 1 segment ({n} records)")
+            done += 1
+    return done
+
+def compact_weather(min_age):
+    done = 0
+    for folder in sorted(glob.glob(f"{BRONZE_ROOTS}/weather_api/")):
+        by_day = defaultdict(list)
+        for f in glob.glob(os.path.join(folder, "weather_*_*_*.json")):
+            by_day[os.path.basename(f).split("_")[2]].append(f)   # weather_Z1_20240401_00.json
+        for day, files in sorted(by_day.items()):
+            files = uncompacted(folder, f"weather_{day}", files)
+            if files and is_cold(files, min_age):
+                n = compact_partition(folder, f"weather_{day}", files, zone_from_name=True)
+                print(f"✓ {folder}weather_{day}: {len(files)} files -> 1 segment ({n} records)")
+                done += 1
+    return done
+
+if __name__=="__main__":
+    ap = argparse.ArgumentParser(description="Compact small bronze files into gzip NDJSON segments")
+    ap.add_argument("--min-age", type=float, default=300,
+                    help="skip partitions with files modified in the last N seconds (live writers)")
+    args = ap.parse_args()
+    n = compact_orders(args.min_age) + compact_weather(args.min_age)
+    print(f"✅ Compacted {n} partitions")
@@ -0,0 +1,95 @@
+# etl_worker.py
+# Long-lived in-process ETL for the live dashboard. File events only call
+# trigger(); one background thread waits until no event has arrived for
+# `debounce` seconds (at most `max_wait` after the first one), then runs one
+# bronze -> silver -> gold build through the pipeline DAG, which skips every
+# node whose inputs did not change. Events that arrive during a build are
+# coalesced into the next one, so there is never more than one build at a
+# time, and pandas & co. are imported once instead of per event.
+import time, threading
+import pipeline
+
+DEBOUNCE = 0.5       # seconds without events before a build starts
+MAX_WAIT = 2.0       # a steady event stream still builds this often
+
+class EtlWorker:
+    def __init__(self, debounce=DEBOUNCE, max_wait=MAX_WAIT, build=None):
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.build = build or (lambda: pipeline.run(pipeline.nodes()))
+        self.cond = threading.Condition()
+        self.first_event = None       # arrival of the oldest event not built yet
+        self.last_event = None
+        self.pending = 0
+        self.building = False
+        self.stopped = False
+        # stats for the dashboard
+        self.builds = 0
+        self.events = 0
+        self.last_latency = None      # first event -> gold written, seconds
+        self.last_error = None
+        self.thread = threading.Thread(target=self.loop, name="etl-worker", daemon=True)
+        self.thread.start()
+
+    def trigger(self):
+        """Note a change in bronze; returns at once"""
+        with self.cond:
+            now = time.monotonic()
+            if self.first_event is None:
+                self.first_event = now
+            self.last_event = now
+            self.pending += 1
+            self.events += 1
+            self.cond.notify()
+
+    def loop(self):
+        while True:
+            with self.cond:
+                while not self.stopped and self.first_event is None:
+                    self.cond.wait()
+                if self.stopped:
+                    return
+                # debounce: wait for a quiet window, bounded by max_wait
+                while not self.stopped:
+                    now = time.monotonic()
+                    due = min(self.last_event + self.debounce, self.first_event + self.max_wait)
+                    if now >= due:
+                        break
+                    self.cond.wait(due - now)
+                first, events = self.first_event, self.pending
+                self.first_event, self.pending = None, 0
+                self.building = True
+            try:
+                self.build()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = repr(e)
+                print(f"✗ ETL build failed: {e!r}")
+            with self.cond:
+                self.building = False
+                self.builds += 1
+                self.last_latency = time.monotonic() - first
+                self.cond.notify_all()
+            print(f"✓ ETL: {events} events -> gold in {self.last_latency:.2f}s")
+
+    def wait_idle(self, timeout=None):
+        """Block until every event so far has been built; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while self.first_event is not None or self.building:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self.cond.wait(left)
+        return True
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        self.thread.join()
+
+    def stats(self):
+        return {"events": self.events, "builds": self.builds, "pending": self.pending,
+                "building": self.building, "last_latency": self.last_latency,
+                "last_error": self.last_error}
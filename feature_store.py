@@ -0,0 +1,127 @@
+# feature_store.py
+# Point-in-time feature store for the ETA model. One row per order_key with
+# the features as they were known at the order's order_time (the as-of
+# timestamp): the rating of the driver version valid then (fact driver_key is
+# SCD-2), the latest weather reading in the driver's zone at or before it, a
+# distance and the time-of-day bucket. Rows are computed vectorised and only
+# for fact rows written since the last update (fact_orders.inserted_at): new
+# orders are appended to the order-date partitions, orders whose fact row was
+# rewritten (a status update that assigned the driver) replace their old row
+# in its partition. Labels are not stored: training_set() joins delivery_minutes
+# from fact_orders when it is read, so PLACED->DELIVERED updates show up
+# without recomputing features.
+import os, json, argparse
+import numpy as np
+import pandas as pd
+from storage import GOLD, read_gold, read_silver, write_gold, append_table, table_exists, concat, partition_dates
+
+TABLE = "ml_delivery_features"
+FEATURES = ["distance_km", "driver_rating", "weather_condition", "time_of_day"]
+CHECKPOINT = f"{GOLD}/_feature_store.json"      # highest order_key and fact inserted_at in the store
+# max age of the weather reading joined to an order (as-of join, per zone)
+WEATHER_TOLERANCE = pd.Timedelta(os.environ.get("WOEAT_WEATHER_TOLERANCE", "1h"))
+
+def load_checkpoint():
+    if not os.path.exists(CHECKPOINT):
+        return {}
+    with open(CHECKPOINT) as fp:
+        return json.load(fp)
+
+def save_checkpoint(cp):
+    tmp = CHECKPOINT + ".tmp"
+    with open(tmp, "w") as fp:
+        json.dump(cp, fp)
+    os.replace(tmp, CHECKPOINT)
+
+def time_of_day(hours):
+    """Morning 6-12, Afternoon 12-18, Evening otherwise (UTC hour)"""
+    hours = np.asarray(hours)
+    return np.select([(hours >= 6) & (hours < 12), (hours >= 12) & (hours < 18)],
+                     ["Morning", "Afternoon"], "Evening")
+
+def distance_km(order_keys):
+    """Synthetic distance (demo), 1-7 km: a hash of the order_key, so an
+    order keeps its distance however often the store is rebuilt"""
+    h = pd.util.hash_array(np.asarray(order_keys, dtype="int64"))
+    return (1 + 6 * (h % 2**32) / 2**32).round(1)
+
+def compute(facts, dim_drivers, weather):
+    """Feature rows of `facts` (order_key, driver_key, order_time)"""
+    order_time = pd.to_datetime(facts["order_time"], utc=True).reset_index(drop=True)
+    by_key = dim_drivers.set_index("driver_key")
+    driver_key = facts["driver_key"].reset_index(drop=True)
+
+    # weather: as-of join on (zone, time); the order's zone is its driver's zone
+    weather = weather.assign(zone=weather["zone"].astype(str)).sort_values("weather_time")
+    probe = pd.DataFrame({"order_time": order_time, "row": np.arange(len(facts)),
+                          "zone": driver_key.map(by_key["zone"]).astype(str)}).sort_values("order_time")
+    joined = pd.merge_asof(probe, weather, left_on="order_time", right_on="weather_time",
+                           by="zone", tolerance=WEATHER_TOLERANCE, direction="backward")
+    condition = np.empty(len(facts), dtype=object)
+    condition[joined["row"].to_numpy()] = joined["condition"].astype(object).to_numpy()
+
+    return pd.DataFrame({
+        "order_key": facts["order_key"].to_numpy(dtype="int64"),
+        "order_time": order_time,
+        "distance_km": distance_km(facts["order_key"]),
+        "driver_rating": driver_key.map(by_key["rating"]).to_numpy(dtype="float64"),
+        "weather_condition": condition,
+        "time_of_day": time_of_day(order_time.dt.hour),
+        "computed_at": pd.Timestamp.utcnow(),
+    })
+
+def update(full=False):
+    """Recompute the orders whose fact row was inserted or rewritten since the
+    last update (all of them with full=True, replacing the store). Returns
+    the rows written."""
+    cp = {} if full or not table_exists(TABLE) else load_checkpoint()
+    last = cp.get("order_key_max", 0)
+    since = cp.get("inserted_at_max")          # stores from before it are rebuilt once
+    facts = read_gold("fact_orders", columns=["order_key", "driver_key", "order_time", "inserted_at"],
+                      filters=[("inserted_at", ">", pd.Timestamp(since))] if since else None)
+    if facts.empty and table_exists(TABLE):
+        print(f"✓ {TABLE} up to date")
+        return 0
+    dim_drivers = pd.read_csv(f"{GOLD}/dim_drivers.csv")
+    weather = read_silver("silver_weather", columns=["zone", "weather_time", "condition"])
+    features = compute(facts, dim_drivers, weather)
+    if not since:
+        write_gold(features, TABLE)
+        how = "written"
+    elif (features["order_key"] > last).all():
+        append_table(features, TABLE)
+        how = "appended"
+    else:
+        # an order keeps its order_time, so its old row is in the same partition
+        old = read_gold(TABLE, dates=set(partition_dates(features, TABLE)))
+        write_gold(concat([old[~old["order_key"].isin(features["order_key"])], features]),
+                   TABLE, replace=False)
+        how = "upserted"
+    cp["order_key_max"] = int(max(last, features["order_key"].max())) if len(features) else last
+    if len(facts):
+        cp["inserted_at_max"] = str(facts["inserted_at"].max())
+    save_checkpoint(cp)
+    print(f"✅ {TABLE}: {len(features)} orders {how}")
+    return len(features)
+
+def utc(ts):
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+def read_features(columns=None, as_of=None):
+    """Feature rows, optionally only orders placed at or before `as_of`
+    (a point-in-time snapshot: later orders did not exist yet)"""
+    return read_gold(TABLE, columns=columns, end=as_of,
+                     filters=[("order_time", "<=", utc(as_of))] if as_of else None)
+
+def training_set(as_of=None):
+    """Features plus the delivery_minutes label from fact_orders; orders
+    not delivered yet have no label (NaN)"""
+    features = read_features(["order_key", "order_time"] + FEATURES, as_of)
+    labels = read_gold("fact_orders", columns=["order_key", "delivery_minutes"], end=as_of)
+    return features.merge(labels, on="order_key", how="left")
+
+if __name__=="__main__":
+    ap = argparse.ArgumentParser(description="Update the ETA feature store from fact_orders")
+    ap.add_argument("--full", action="store_true", help="recompute every order")
+    update(ap.parse_args().full)
@@ -1,142 +1,250 @@
 # generate_woeat_data.py
-import json, csv, os, random
+import json, csv, os, random, argparse
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from faker import Faker
+import numpy as np
 import pandas as pd
+from bronze_segments import SegmentWriter
 fake = Faker()
 
 BASE = "woeat_demo"
 START_DATE = datetime(2024, 4, 1)
 DAYS = 7
+ORDERS_PER_DAY = 3000
+SEGMENT_BYTES = 64*1024*1024
+BATCH_ROWS = 50000
 
 # 1. helpers
 def ensure(path):
     os.makedirs(path, exist_ok=True)
 
-def daterange():
-    for d in range(DAYS):
+def daterange(days=DAYS):
+    for d in range(days):
         yield START_DATE + timedelta(days=d)
 
 # 2. seed dimension lists
-restaurants = [
-    {"restaurant_id": f"R{300+i}",
-     "name": fake.company() + " Kitchen",
-     "cuisine": random.choice(["Italian","Japanese","Mexican","Vegan","Burgers"]),
-     "zone": random.choice(["Z1","Z2"])}
-    for i in range(50)
-]
-
-drivers = [
-    {"driver_id": f"D{200+i}",
-     "name": fake.first_name(),
-     "rating": round(random.uniform(4.0,4.9),2),
-     "zone": random.choice(["Z1","Z2"])}
-    for i in range(200)
-]
-
-menu_items = []
-for r in restaurants:
-    for i in range(10):
-        idx = len(menu_items)+400
-        menu_items.append({
-            "item_id": f"M{idx}",
-            "restaurant_id": r["restaurant_id"],
-            "item_name": fake.word().capitalize()+" "+random.choice(["Bowl","Pizza","Roll","Salad","Burger"]),
-            "category": r["cuisine"],
-            "base_price": round(random.uniform(5,20),2)
-        })
-
-customers = [f"C{100+i}" for i in range(1000)]
-
-# 3. generate Bronze files
-orders = []
-bronze_root = os.path.join(BASE,"bronze")
-ensure(bronze_root)
-
-for day in daterange():
+def build_dimensions():
+    restaurants = [
+        {"restaurant_id": f"R{300+i}",
+         "name": fake.company() + " Kitchen",
+         "cuisine": random.choice(["Italian","Japanese","Mexican","Vegan","Burgers"]),
+         "zone": random.choice(["Z1","Z2"])}
+        for i in range(50)
+    ]
+
+    drivers = [
+        {"driver_id": f"D{200+i}",
+         "name": fake.first_name(),
+         "rating": round(random.uniform(4.0,4.9),2),
+         "zone": random.choice(["Z1","Z2"])}
+        for i in range(200)
+    ]
+
+    menu_items = []
+    for r in restaurants:
+        for i in range(10):
+            idx = len(menu_items)+400
+            menu_items.append({
+                "item_id": f"M{idx}",
+                "restaurant_id": r["restaurant_id"],
+                "item_name": fake.word().capitalize()+" "+random.choice(["Bowl","Pizza","Roll","Salad","Burger"]),
+                "category": r["cuisine"],
+                "base_price": round(random.uniform(5,20),2)
+            })
+
+    customers = [f"C{100+i}" for i in range(1000)]
+    return restaurants, drivers, menu_items, customers
+
+def index_items(menu_items):
+    """restaurant_id -> [item_id, ...], built once instead of per order"""
+    by_rest = {}
+    for m in menu_items:
+        by_rest.setdefault(m["restaurant_id"], []).append(m["item_id"])
+    return by_rest
+
+# 3. generate Bronze order files (one task per day)
+def generate_day(task):
+    """Write one day of orders in their final state. Each day has its own RNG
+    seeded from (seed, day index) so the output does not depend on --workers."""
+    (day_idx, seed, n_orders, bronze_root,
+     restaurant_ids, items_by_rest, customers, driver_ids, layout) = task
+    rng = random.Random(f"{seed}-{day_idx}")
+    day = START_DATE + timedelta(days=day_idx)
     day_path = os.path.join(bronze_root,"orders_stream",day.strftime("%Y-%m-%d"))
     ensure(day_path)
-    for _ in range(3000):                         # 3k orders per day
-        order_time = day + timedelta(
-            seconds=random.randint(0,86399))
-        restaurant = random.choice(restaurants)
-        items = random.sample(
-            [m["item_id"] for m in menu_items if m["restaurant_id"]==restaurant["restaurant_id"]],
-            random.randint(1,2))
+    segments = None
+    if layout == "segments":
+        segments = SegmentWriter(os.path.join(bronze_root,"orders_stream"),
+                                 max_bytes=SEGMENT_BYTES, max_seconds=float("inf"))
+    first_id = 1000 + day_idx*n_orders
+    for n in range(n_orders):
+        order_time = day + timedelta(seconds=rng.randint(0,86399))
+        restaurant_id = rng.choice(restaurant_ids)
+        items = rng.sample(items_by_rest[restaurant_id], rng.randint(1,2))
         order = {
-            "order_id": f"O-{len(orders)+1000}",
-            "customer_id": random.choice(customers),
-            "restaurant_id": restaurant["restaurant_id"],
-            "driver_id": None,   # will assign later
+            "order_id": f"O-{first_id+n}",
+            "customer_id": rng.choice(customers),
+            "restaurant_id": restaurant_id,
+            "driver_id": None,
             "items": items,
             "order_time": order_time.isoformat()+"Z",
             "status": "PLACED"
         }
-        # save json
-        with open(os.path.join(day_path, order["order_id"]+".json"),"w") as f:
-            json.dump(order,f)
-        orders.append(order)
-
-# 4. drivers assignment & delivery updates
-for o in orders:
-    if random.random()<0.9:  # 90% delivered
-        drv = random.choice(drivers)
-        o["driver_id"]=drv["driver_id"]
-        deliver_time = datetime.fromisoformat(o["order_time"][:-1])+timedelta(minutes=random.randint(20,70))
-        o["delivery_time"]=deliver_time.isoformat()+"Z"
-        o["status"]="DELIVERED"
-
-# overwrite jsons with updated status
-for o in orders:
-    day = o["order_time"][:10]
-    path = os.path.join(bronze_root,"orders_stream",day,o["order_id"]+".json")
-    with open(path,"w") as f:
-        json.dump(o,f)
-
-# 5. restaurant performance CSVs (late)
-perf_path = os.path.join(bronze_root,"restaurant_reports")
-ensure(perf_path)
-rows=[]
-for day in daterange():
-    for r in restaurants:
-        row = {
-            "report_date": day.strftime("%Y-%m-%d"),
-            "restaurant_id": r["restaurant_id"],
-            "avg_prep_time": random.randint(15,30),
-            "avg_rating": round(random.uniform(3.5,4.8),1),
-            "orders_count": random.randint(50,300),
-            "cancel_rate": round(random.uniform(0.0,0.15),2),
-            "avg_tip": round(random.uniform(0.0,3.0),2)
-        }
-        rows.append(row)
-# write one big CSV (easier)
-with open(os.path.join(perf_path,"restaurant_perf.csv"),"w",newline="") as f:
-    writer=csv.DictWriter(f,fieldnames=rows[0].keys())
-    writer.writeheader(); writer.writerows(rows)
-
-# 6. menu dump files
-menu_path=os.path.join(bronze_root,"menu_items"); ensure(menu_path)
-for r in restaurants:
-    dump=[m for m in menu_items if m["restaurant_id"]==r["restaurant_id"]]
-    with open(os.path.join(menu_path,f"menu_{r['restaurant_id']}.json"),"w") as f:
-        json.dump(dump,f)
-
-# 7. driver roster
-driver_path=os.path.join(bronze_root,"drivers"); ensure(driver_path)
-pd.DataFrame(drivers).to_csv(os.path.join(driver_path,"drivers_2024-04-01.csv"),index=False)
-
-# 8. weather API
-weather_path=os.path.join(bronze_root,"weather_api"); ensure(weather_path)
-for day in daterange():
-    for hour in range(24):
-        for zone in ["Z1","Z2"]:
-            resp={
-              "weather_time": (day+timedelta(hours=hour)).isoformat()+"Z",
-              "temperature": round(random.uniform(15,32),1),
-              "condition": random.choice(["Sunny","Clouds","Rain","Wind"])
+        # drivers assignment & delivery update decided up front
+        if rng.random()<0.9:  # 90% delivered
+            order["driver_id"] = rng.choice(driver_ids)
+            deliver_time = order_time+timedelta(minutes=rng.randint(20,70))
+            order["delivery_time"] = deliver_time.isoformat()+"Z"
+            order["status"] = "DELIVERED"
+        if segments is not None:
+            segments.write(order, day.strftime("%Y-%m-%d"))
+        else:
+            with open(os.path.join(day_path, order["order_id"]+".json"),"w") as f:
+                json.dump(order,f)
+    if segments is not None:
+        segments.close()
+    return n_orders
+
+def generate_day_columnar(task):
+    """NumPy engine: draw every order attribute for the day as arrays and
+    append the day to NDJSON segments in batches of BATCH_ROWS."""
+    (day_idx, seed, n_orders, bronze_root,
+     restaurant_ids, items_by_rest, customers, driver_ids, _) = task
+    rng = np.random.default_rng([seed, day_idx])
+    day = START_DATE + timedelta(days=day_idx)
+
+    # flat item table: items of restaurant r live at offsets[r]:offsets[r]+counts[r]
+    counts = np.array([len(items_by_rest[r]) for r in restaurant_ids])
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    item_ids = np.array([i for r in restaurant_ids for i in items_by_rest[r]], dtype=object)
+
+    rest = rng.integers(0, len(restaurant_ids), n_orders)
+    cnt = counts[rest]
+    first = rng.integers(0, cnt)
+    second = (first + rng.integers(1, np.maximum(cnt, 2))) % cnt   # distinct from first
+    two = (rng.random(n_orders) < 0.5) & (cnt > 1)
+    item1 = item_ids[offsets[rest] + first]
+    item2 = item_ids[offsets[rest] + second]
+    items = [[a, b] if t else [a] for a, b, t in zip(item1, item2, two)]
+
+    order_time = np.datetime64(day, "s") + rng.integers(0, 86400, n_orders).astype("timedelta64[s]")
+    delivered = rng.random(n_orders) < 0.9                          # 90% delivered
+    deliver_time = order_time + (rng.integers(20, 71, n_orders)*60).astype("timedelta64[s]")
+    drv = np.array(driver_ids, dtype=object)[rng.integers(0, len(driver_ids), n_orders)]
+
+    df = pd.DataFrame({
+        "order_id": [f"O-{i}" for i in range(1000 + day_idx*n_orders, 1000 + (day_idx+1)*n_orders)],
+        "customer_id": np.array(customers, dtype=object)[rng.integers(0, len(customers), n_orders)],
+        "restaurant_id": np.array(restaurant_ids, dtype=object)[rest],
+        "driver_id": np.where(delivered, drv, None),
+        "items": items,
+        "order_time": np.char.add(np.datetime_as_string(order_time, unit="s"), "Z"),
+        "status": np.where(delivered, "DELIVERED", "PLACED"),
+        "delivery_time": np.where(delivered,
+                                  np.char.add(np.datetime_as_string(deliver_time, unit="s"), "Z"),
+                                  None),
+    })
+    with SegmentWriter(os.path.join(bronze_root,"orders_stream"),
+                       max_bytes=SEGMENT_BYTES, max_seconds=float("inf")) as segments:
+        for start in range(0, n_orders, BATCH_ROWS):
+            batch = df.iloc[start:start+BATCH_ROWS].to_json(orient="records", lines=True)
+            segments.write_lines(batch if batch.endswith("\n") else batch+"\n",
+                                 day.strftime("%Y-%m-%d"))
+    return n_orders
+
+ENGINES = {"python": generate_day, "numpy": generate_day_columnar}
+
+def generate_orders(bronze_root, restaurants, drivers, items_by_rest, customers,
+                    days, n_orders, seed, workers, engine="python", layout="files"):
+    restaurant_ids = [r["restaurant_id"] for r in restaurants]
+    driver_ids = [d["driver_id"] for d in drivers]
+    tasks = [(d, seed, n_orders, bronze_root, restaurant_ids, items_by_rest,
+              customers, driver_ids, layout) for d in range(days)]
+    fn = ENGINES[engine]
+    if workers <= 1:
+        return sum(map(fn, tasks))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(fn, tasks))
+
+# 4. restaurant performance CSVs (late)
+def write_restaurant_reports(bronze_root, restaurants, days):
+    perf_path = os.path.join(bronze_root,"restaurant_reports")
+    ensure(perf_path)
+    rows=[]
+    for day in daterange(days):
+        for r in restaurants:
+            row = {
+                "report_date": day.strftime("%Y-%m-%d"),
+                "restaurant_id": r["restaurant_id"],
+                "avg_prep_time": random.randint(15,30),
+                "avg_rating": round(random.uniform(3.5,4.8),1),
+                "orders_count": random.randint(50,300),
+                "cancel_rate": round(random.uniform(0.0,0.15),2),
+                "avg_tip": round(random.uniform(0.0,3.0),2)
             }
-            fname=f"weather_{zone}_{day.strftime('%Y%m%d')}_{hour:02}.json"
-            with open(os.path.join(weather_path,fname),"w") as f:
-                json.dump(resp,f)
-
-print("✅ Fake Bronze data generated in", bronze_root)
+            rows.append(row)
+    # write one big CSV (easier)
+    with open(os.path.join(perf_path,"restaurant_perf.csv"),"w",newline="") as f:
+        writer=csv.DictWriter(f,fieldnames=rows[0].keys())
+        writer.writeheader(); writer.writerows(rows)
+
+# 5. menu dump files
+def write_menus(bronze_root, restaurants, items_by_rest, menu_items):
+    menu_path=os.path.join(bronze_root,"menu_items"); ensure(menu_path)
+    by_id = {m["item_id"]: m for m in menu_items}
+    for r in restaurants:
+        dump=[by_id[i] for i in items_by_rest[r["restaurant_id"]]]
+        with open(os.path.join(menu_path,f"menu_{r['restaurant_id']}.json"),"w") as f:
+            json.dump(dump,f)
+
+# 6. driver roster
+def write_drivers(bronze_root, drivers):
+    driver_path=os.path.join(bronze_root,"drivers"); ensure(driver_path)
+    pd.DataFrame(drivers).to_csv(os.path.join(driver_path,"drivers_2024-04-01.csv"),index=False)
+
+# 7. weather API
+def write_weather(bronze_root, days):
+    weather_path=os.path.join(bronze_root,"weather_api"); ensure(weather_path)
+    for day in daterange(days):
+        for hour in range(24):
+            for zone in ["Z1","Z2"]:
+                resp={
+                  "weather_time": (day+timedelta(hours=hour)).isoformat()+"Z",
+                  "temperature": round(random.uniform(15,32),1),
+                  "condition": random.choice(["Sunny","Clouds","Rain","Wind"])
+                }
+                fname=f"weather_{zone}_{day.strftime('%Y%m%d')}_{hour:02}.json"
+                with open(os.path.join(weather_path,fname),"w") as f:
+                    json.dump(resp,f)
+
+if __name__=="__main__":
+    ap = argparse.ArgumentParser(description="Generate fake WoEat bronze data")
+    ap.add_argument("--scale", type=float, default=1.0,
+                    help=f"multiplier on {ORDERS_PER_DAY} orders per day")
+    ap.add_argument("--days", type=int, default=DAYS)
+    ap.add_argument("--workers", type=int, default=1,
+                    help="processes used to generate order days")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--engine", choices=sorted(ENGINES), default="python",
+                    help="python: per-order RNG loop; numpy: vectorized, always writes segments")
+    ap.add_argument("--layout", choices=["files","segments"], default="files",
+                    help="files: one JSON file per order; segments: rolled NDJSON segments")
+    args = ap.parse_args()
+
+    random.seed(args.seed)
+    Faker.seed(args.seed)
+    bronze_root = os.path.join(BASE,"bronze")
+    ensure(bronze_root)
+
+    restaurants, drivers, menu_items, customers = build_dimensions()
+    items_by_rest = index_items(menu_items)
+    n_orders = int(ORDERS_PER_DAY*args.scale)
+    total = generate_orders(bronze_root, restaurants, drivers, items_by_rest, customers,
+                            args.days, n_orders, args.seed, args.workers, args.engine, args.layout)
+    write_restaurant_reports(bronze_root, restaurants, args.days)
+    write_menus(bronze_root, restaurants, items_by_rest, menu_items)
+    write_drivers(bronze_root, drivers)
+    write_weather(bronze_root, args.days)
+
+    print(f"✅ Fake Bronze data generated in {bronze_root} ({total:,} orders)")
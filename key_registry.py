@@ -0,0 +1,62 @@
+# key_registry.py
+# Persistent natural ID -> surrogate key registry for the gold build. Keys are
+# handed out once, in first-seen order, and never change afterwards, so gold
+# tables can be appended to and cached across runs.
+import os
+import numpy as np
+import pandas as pd
+
+KEYS = "woeat_demo/gold/_keys"
+
+class KeyRegistry:
+    """Lookups go through a hashed pd.Index over the natural IDs, with the
+    surrogate keys in a parallel int64 array."""
+
+    def __init__(self, name, root=KEYS):
+        self.path = os.path.join(root, f"{name}.parquet")
+        if os.path.exists(self.path):
+            df = pd.read_parquet(self.path)
+            self.index = pd.Index(df["natural_id"].astype(str))
+            self.keys = df["key"].to_numpy(dtype="int64")
+        else:
+            self.index = pd.Index([], dtype=object)
+            self.keys = np.empty(0, dtype="int64")
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.keys)
+
+    def assign(self, values):
+        """Keys for `values`, registering natural IDs not seen before"""
+        values = pd.Series(values)
+        uniq = pd.unique(values.dropna().astype(str))
+        new = uniq[self.index.get_indexer(uniq) == -1]
+        if len(new):
+            start = self.keys.max() + 1 if len(self.keys) else 1
+            self.index = self.index.append(pd.Index(new))
+            self.keys = np.concatenate([self.keys, np.arange(start, start + len(new), dtype="int64")])
+            self.dirty = True
+        return self.lookup(values)
+
+    def lookup(self, values):
+        """Keys for `values`; <NA> for unknown or missing IDs"""
+        values = pd.Series(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # hash each category once, then gather by the integer codes
+            keys = self.lookup(values.cat.categories).array
+            return pd.Series(keys.take(values.cat.codes.to_numpy(), allow_fill=True), index=values.index)
+        pos = self.index.get_indexer(values.astype(str).where(values.notna(), None))
+        hit = pos >= 0
+        keys = pd.array(np.zeros(len(pos), dtype="int64"), dtype="Int64")
+        keys[hit] = self.keys[pos[hit]]
+        keys[~hit] = pd.NA
+        return pd.Series(keys, index=values.index)
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        pd.DataFrame({"natural_id": self.index.astype(str), "key": self.keys}) \
+            .to_parquet(self.path + ".tmp", index=False)
+        os.replace(self.path + ".tmp", self.path)
+        self.dirty = False
@@ -0,0 +1,107 @@
+# kpi_aggregates.py
+# Order KPIs computed from fact_orders. The gold table agg_orders_cube keeps
+# additive state at the finest grain the dashboards use
+# (order_date, hour, zone, cuisine_type, time_period): order count,
+# delivered count, sum of delivery minutes, SLA breaches and revenue. A fact
+# upsert adds the new rows and subtracts the rows they replaced, so an update
+# costs O(changed facts). Every coarser view (the kpi_delivery_daily table,
+# the rollup cube's sub-totals) is summed from that state, and averages and
+# percentages are only derived at the end, so rollups stay exact.
+import numpy as np
+import pandas as pd
+
+GRAIN = ["order_date", "hour", "zone", "cuisine_type", "time_period"]
+GROUP = ["order_date", "time_period", "zone"]          # kpi_delivery_daily
+MEASURES = ["orders", "delivered", "delivery_min_sum", "sla_breaches", "revenue"]
+ALL = "ALL"                   # value of a rolled-up column (hour: -1)
+NO_ZONE = "Unassigned"        # orders without a driver
+
+# sub-totals precomputed into the rollup cube, besides the grain itself
+GROUPING_SETS = [
+    ("order_date", "time_period", "zone"),
+    ("order_date", "zone"),
+    ("order_date",),
+    ("zone", "time_period"),
+    ("zone",),
+    ("time_period",),
+    ("hour",),
+    ("cuisine_type", "time_period"),
+    ("cuisine_type",),
+    (),
+]
+
+def time_period(times):
+    """Morning 6-12, Afternoon 12-18, Evening 18-24, Night 0-6 (UTC hour)"""
+    hour = pd.to_datetime(pd.Series(times), utc=True).dt.hour.to_numpy()
+    return np.select([hour < 6, hour < 12, hour < 18], ["Night", "Morning", "Afternoon"], "Evening")
+
+def contributions(facts, zone_by_driver, cuisine_by_restaurant):
+    """Per-grain measures of fact_orders rows. Zone and cuisine are those of
+    the driver / restaurant version on the fact."""
+    order_time = pd.to_datetime(facts["order_time"], utc=True)
+    delivered = facts["delivery_minutes"].notna()
+    df = pd.DataFrame({
+        "order_date": order_time.dt.strftime("%Y-%m-%d"),
+        "hour": order_time.dt.hour.astype("int64"),
+        "zone": facts["driver_key"].map(zone_by_driver).astype(object).fillna(NO_ZONE),
+        "cuisine_type": facts["restaurant_key"].map(cuisine_by_restaurant).astype(object).fillna("Unknown"),
+        "time_period": time_period(order_time),
+        "orders": 1,
+        "delivered": delivered.astype("int64"),
+        "delivery_min_sum": facts["delivery_minutes"].fillna(0.0),
+        "sla_breaches": (facts["sla_breached"].astype(bool) & delivered).astype("int64"),
+        "revenue": facts["total_amount"].fillna(0.0),
+    })
+    return df.groupby(GRAIN, as_index=False)[MEASURES].sum()
+
+def apply_delta(state, added, removed=None):
+    """state + added - removed, per grain; groups left without orders are dropped"""
+    parts = [state, added]
+    if removed is not None and len(removed):
+        parts.append(removed.assign(**{m: -removed[m] for m in MEASURES}))
+    parts = [p for p in parts if p is not None and len(p)]
+    if not parts:
+        return pd.DataFrame(columns=GRAIN + MEASURES)
+    df = pd.concat(parts, ignore_index=True)
+    for col in GRAIN:
+        if col != "hour":
+            df[col] = df[col].astype(str)
+    df = df.groupby(GRAIN, as_index=False)[MEASURES].sum()
+    return df[df["orders"] > 0].reset_index(drop=True)
+
+def rollup(state, dims):
+    """Sum the state over every grain column not in `dims`"""
+    dims = list(dims)
+    if dims:
+        return state.groupby(dims, as_index=False, observed=True)[MEASURES].sum()
+    return state[MEASURES].sum().to_frame().T
+
+def cube(state):
+    """The grain plus every GROUPING_SETS sub-total, one table. Rolled-up
+    columns hold ALL (hour: -1); `grouping` names the kept columns ("total"
+    for the grand total)."""
+    frames = []
+    for dims in [tuple(GRAIN)] + GROUPING_SETS:
+        part = rollup(state, dims)
+        for col in GRAIN:
+            if col not in dims:
+                part[col] = -1 if col == "hour" else ALL
+        part["grouping"] = ",".join(dims) or "total"
+        frames.append(part[["grouping"] + GRAIN + MEASURES])
+    df = pd.concat(frames, ignore_index=True)
+    df["hour"] = df["hour"].astype("int64")
+    return df
+
+def kpi_delivery_daily(state):
+    """Dashboard KPI table (same columns as the synthetic kpi_delivery_daily);
+    orders without a zone are left out"""
+    g = rollup(state[state["zone"].astype(str) != NO_ZONE], GROUP)
+    delivered = g["delivered"].where(g["delivered"] > 0)
+    return pd.DataFrame({
+        "order_date": g["order_date"].astype(str),
+        "time_period": g["time_period"].astype(str),
+        "zone": g["zone"].astype(str),
+        "orders": g["orders"].astype("int64"),
+        "avg_delivery_min": (g["delivery_min_sum"] / delivered).round(2),
+        "sla_breach_pct": (g["sla_breaches"] / delivered).round(4),
+    }).sort_values(GROUP, kind="stable").reset_index(drop=True)
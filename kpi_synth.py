@@ -0,0 +1,178 @@
+# kpi_synth.py
+# Synthetic dashboard KPIs (delivery, menu item sales, cuisine performance).
+# Every table is built in one shot on the date x group x time-period grid:
+# factor arrays are broadcast over the grid and all noise is drawn at once,
+# so multi-year, many-zone tables take well under a second.
+import os, time, argparse
+import numpy as np
+import pandas as pd
+
+KPI = "woeat_demo/kpi"
+START_DATE = "2024-01-01"           # start from January for more history
+DAYS = 90
+ZONES = 5
+SEED = 123
+
+TIME_PERIODS = ["Morning", "Afternoon", "Evening", "Night"]
+
+# delivery: higher = slower
+ZONE_FACTOR = {"Z1": 1.08, "Z2": 1.02, "Z3": 0.95, "Z4": 0.90, "Z5": 1.05}
+PERIOD_FACTOR = np.array([0.92, 1.0, 1.15, 0.88])            # evening rush is worse
+
+# menu items: category -> (items low, high, price low, high, peak period,
+#                          items low, high outside the peak)
+CATEGORIES = {
+    "Main Course":    (250, 400, 15, 25, None, 0, 0),
+    "Appetizer":      (180, 300,  8, 12, None, 0, 0),
+    "Dessert":        ( 80, 150,  6, 10, None, 0, 0),
+    "Beverage":       (200, 350,  3,  7, None, 0, 0),
+    "Side Dish":      (120, 250,  5,  9, None, 0, 0),
+    "Breakfast":      (100, 200, 10, 18, "Morning", 10, 30),
+    "Lunch Special":  (150, 300, 12, 20, "Afternoon", 20, 50),
+    "Dinner Special": (180, 350, 18, 30, "Evening", 30, 70),
+    "Healthy Option": ( 50, 120, 12, 22, None, 0, 0),   # new year resolutions: +30% in January
+    "Combo Meal":     (100, 200, 20, 35, None, 0, 0),
+}
+
+# cuisine -> (orders low, high, revenue per order low, high, delivery mean, sd)
+CUISINES = {
+    "Italian":       (80, 140, 25, 35, 40, 4),
+    "Japanese":      (50,  90, 30, 45, 42, 3),
+    "Mexican":       (60, 110, 20, 30, 48, 5),   # slightly above SLA, +40% on weekends
+    "Vegan":         (30,  60, 18, 28, 38, 4),   # trending up: +50% over a year
+    "Burgers":       (70, 120, 15, 25, 35, 3),
+    "Chinese":       (60, 100, 20, 30, 37, 4),   # +30% for dinner
+    "Thai":          (40,  80, 22, 32, 43, 3),
+    "Indian":        (35,  75, 25, 40, 45, 4),   # +40% for dinner
+    "American":      (65, 110, 18, 28, 36, 3),   # +30% for lunch
+    "Mediterranean": (30,  70, 23, 33, 41, 3),   # +20% in summer
+}
+CUISINE_PERIOD_FACTOR = np.array([0.6, 1.1, 1.4, 0.9])
+
+def calendar(start=START_DATE, days=DAYS):
+    """Date strings plus weekday / day-of-year / month arrays"""
+    dates = pd.date_range(start, periods=days, freq="D")
+    return (np.asarray(dates.strftime("%Y-%m-%d")), dates.dayofweek.to_numpy(),
+            dates.dayofyear.to_numpy(), dates.month.to_numpy())
+
+def grid(*sizes):
+    """Flat index arrays of the cartesian grid, first axis slowest (loop order)"""
+    return [a.ravel() for a in np.meshgrid(*map(np.arange, sizes), indexing="ij")]
+
+def kpi_delivery(rng, start=START_DATE, days=DAYS, zones=ZONES):
+    date_strs, dow, doy, _ = calendar(start, days)
+    zone_names = [f"Z{i+1}" for i in range(zones)]
+    d, z, p = grid(days, zones, len(TIME_PERIODS))
+    n = d.size
+
+    zone_factor = np.array([ZONE_FACTOR.get(name, 1.0) for name in zone_names])
+    seasonal = np.maximum(0, 1.0 - doy / 365 * 0.15)        # improving as the year goes on
+    weekend = np.where(dow >= 5, 1.12, 1.0)
+    avg = 38 * zone_factor[z] * PERIOD_FACTOR[p] * seasonal[d] * weekend[d] + rng.normal(0, 2, n)
+
+    # breach share grows with delivery time
+    breach = np.clip(np.clip((avg - 35) / 20, 0, 0.8) + rng.normal(0, 0.05, n), 0.1, 0.9)
+    return pd.DataFrame({
+        "order_date": date_strs[d],
+        "time_period": np.array(TIME_PERIODS)[p],
+        "zone": np.array(zone_names)[z],
+        "orders": rng.integers(200, 500, n),
+        "avg_delivery_min": avg.round(2),
+        "sla_breach_pct": breach.round(4),
+    })
+
+def kpi_menu_item_sales(rng, start=START_DATE, days=DAYS):
+    date_strs, dow, _, month = calendar(start, days)
+    names = list(CATEGORIES)
+    spec = list(CATEGORIES.values())
+    d, c, p = grid(days, len(names), len(TIME_PERIODS))
+    n = d.size
+
+    # items range per (category, period): peak-period categories are quiet off-peak
+    low = np.array([[s[0] if s[4] in (None, per) else s[5] for per in TIME_PERIODS] for s in spec])
+    high = np.array([[s[1] if s[4] in (None, per) else s[6] for per in TIME_PERIODS] for s in spec])
+    boost = np.where((np.array(names)[c] == "Healthy Option") & (month[d] == 1), 1.3, 1.0)
+    base_items = np.floor(rng.integers(low[c, p], high[c, p]) * boost)
+
+    period_mult = np.array([[1.0 if name == "Breakfast" else 0.7,
+                             1.2 if name == "Lunch Special" else 0.9,
+                             1.3 if name == "Dinner Special" else 1.1,
+                             0.8 if name in ("Beverage", "Dessert") else 0.5] for name in names])
+    weekend = np.where(dow >= 5, 1.4, 1.0)
+    quantity = np.floor(base_items * period_mult[c, p] * weekend[d]).astype("int64")
+
+    price_low = np.array([s[2] for s in spec])
+    price_high = np.array([s[3] for s in spec])
+    price = rng.uniform(price_low[c], price_high[c])
+    price = np.where(rng.random(n) < 0.1, price * 0.85, price)  # 10% promotions, 15% off
+    return pd.DataFrame({
+        "order_date": date_strs[d],
+        "time_period": np.array(TIME_PERIODS)[p],
+        "category": np.array(names)[c],
+        "total_items_sold": quantity,
+        "total_sales": (quantity * price).round(2),
+    })
+
+def kpi_cuisine_performance(rng, start=START_DATE, days=DAYS):
+    date_strs, dow, doy, month = calendar(start, days)
+    names = np.array(list(CUISINES))
+    spec = np.array(list(CUISINES.values()), dtype=float)
+    d, c, p = grid(days, len(names), len(TIME_PERIODS))
+    n = d.size
+    cuisine, period = names[c], np.array(TIME_PERIODS)[p]
+
+    boost = np.select(
+        [cuisine == "Mexican", cuisine == "Vegan", cuisine == "Chinese",
+         cuisine == "Indian", cuisine == "American", cuisine == "Mediterranean"],
+        [np.where(dow[d] >= 5, 1.4, 1.0),
+         1 + doy[d] / 365 * 0.5,
+         np.where(period == "Evening", 1.3, 1.0),
+         np.where(period == "Evening", 1.4, 1.0),
+         np.where(period == "Afternoon", 1.3, 1.0),
+         np.where(np.isin(month[d], [6, 7, 8]), 1.2, 1.0)],
+        1.0)
+    base_orders = np.floor(rng.integers(spec[c, 0].astype(int), spec[c, 1].astype(int)) * boost)
+    revenue_per_order = rng.uniform(spec[c, 2], spec[c, 3])
+    delivery = rng.normal(spec[c, 4], spec[c, 5])
+    delivery = np.where(rng.random(n) < 0.15, delivery * 1.3, delivery)   # bad-weather days
+    delivery = delivery * np.where(dow[d] >= 5, 1.08, 1.0)
+
+    orders = np.floor(base_orders * CUISINE_PERIOD_FACTOR[p]).astype("int64")
+    return pd.DataFrame({
+        "order_date": date_strs[d],
+        "time_period": period,
+        "cuisine_type": cuisine,
+        "orders": orders,
+        "avg_delivery_min": delivery.round(2),
+        "revenue": (orders * revenue_per_order).round(2),
+    })
+
+def synthesize(seed=SEED, start=START_DATE, days=DAYS, zones=ZONES):
+    """{table name: DataFrame} of every synthetic KPI table"""
+    rng = np.random.default_rng(seed)
+    delivery = kpi_delivery(rng, start, days, zones)
+    driver = delivery.rename(columns={"orders": "total_deliveries",
+                                      "avg_delivery_min": "avg_delivery_minutes"})
+    return {
+        "kpi_delivery_daily": delivery,
+        "kpi_driver_performance_daily": driver,
+        "kpi_menu_item_sales": kpi_menu_item_sales(rng, start, days),
+        "kpi_cuisine_performance": kpi_cuisine_performance(rng, start, days),
+    }
+
+if __name__=="__main__":
+    ap = argparse.ArgumentParser(description="Generate synthetic KPI tables (e.g. for dashboard load tests)")
+    ap.add_argument("--days", type=int, default=DAYS)
+    ap.add_argument("--zones", type=int, default=ZONES)
+    ap.add_argument("--start", default=START_DATE)
+    ap.add_argument("--seed", type=int, default=SEED)
+    ap.add_argument("--out", default=KPI)
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    tables = synthesize(args.seed, args.start, args.days, args.zones)
+    t1 = time.perf_counter()
+    os.makedirs(args.out, exist_ok=True)
+    for name, df in tables.items():
+        df.to_csv(f"{args.out}/{name}.csv", index=False)
+    print(f"✅ {sum(map(len, tables.values())):,} KPI rows synthesized in {t1-t0:.2f}s "
+          f"(+{time.perf_counter()-t1:.2f}s CSV) -> {args.out}")
@@ -12,7 +12,7 @@ import {
   Cell,
   ReferenceLine
 } from 'recharts';
-import { fetchCuisineData, aggregateSLABreachByTimeOfDay } from '../utils/dataUtils';
+import { fetchTimeOfDayData, aggregateSLABreachByTimeOfDay } from '../utils/dataUtils';
 import './SLABreachByTimeOfDay.css';
 
 // Fallback data in case everything else fails
@@ -113,7 +113,7 @@ const SLABreachByTimeOfDay = forwardRef((props, ref) => {
     const loadData = async () => {
       try {
         setLoading(true);
-        const responseData = await fetchCuisineData();
+        const responseData = await fetchTimeOfDayData();
         
         if (!responseData || responseData.length === 0) {
           console.warn('No time period data received, using fallback data');
@@ -44,21 +44,33 @@ const FALLBACK_DATA = [
   { order_date: '2024-04-05', zone: 'Z2', orders: 1380, avg_delivery_min: 44.32, sla_breach_pct: 0.48 }
 ];
 
-// Function to fetch actual data from the CSV file in public folder
+// Rollup cube written by silver_to_gold.py; one row per (grouping, key)
+const ROLLUP_CUBE_URL = '/data/kpi/kpi_rollup_cube.csv';
+const NO_ZONE = 'Unassigned';
+export const DAY_ZONE = 'order_date,zone';
+export const DAY_PERIOD_ZONE = 'order_date,time_period,zone';
+
+// Fetch one rollup of the cube and derive the averages from its sums
+export const fetchRollupCube = async (grouping) => {
+  const response = await fetch(ROLLUP_CUBE_URL);
+  if (!response.ok) {
+    throw new Error('Failed to fetch rollup cube');
+  }
+  const csvText = await response.text();
+  return parseCSV(csvText)
+    .filter(row => row.grouping === grouping && row.zone !== NO_ZONE)
+    .map(row => ({
+      ...row,
+      avg_delivery_min: row.delivered > 0 ? row.delivery_min_sum / row.delivered : 0,
+      sla_breach_pct: row.delivered > 0 ? row.sla_breaches / row.delivered : 0
+    }));
+};
+
+// Function to fetch the day x zone rollup from the cube in public folder
 export const fetchSLABreachData = async () => {
   try {
-    console.log('Fetching CSV data from public folder...');
-    // Fetch the CSV file from public folder
-    const response = await fetch('/data/kpi/kpi_delivery_daily.csv');
-    if (!response.ok) {
-      throw new Error('Failed to fetch KPI data');
-    }
-    
-    const csvText = await response.text();
-    console.log('Raw CSV data received:', csvText.substring(0, 300) + '...');
-    
-    // Parse CSV data
-    const parsedData = parseCSV(csvText);
+    console.log('Fetching rollup cube from public folder...');
+    const parsedData = await fetchRollupCube(DAY_ZONE);
     console.log('Parsed data (first 2 items):', parsedData.slice(0, 2));
     
     // Split data into initial load and simulation parts
@@ -102,6 +114,16 @@ export const fetchSLABreachData = async () => {
   }
 };
 
+// Function to fetch the day x time period x zone rollup from the cube
+export const fetchTimeOfDayData = async () => {
+  try {
+    return await fetchRollupCube(DAY_PERIOD_ZONE);
+  } catch (error) {
+    console.error('Error fetching time period data:', error);
+    return [];
+  }
+};
+
 // Function to fetch cuisine performance data
 export const fetchCuisineData = async () => {
   try {
@@ -132,6 +154,25 @@ export const fetchMenuItemData = async () => {
   }
 };
 
+// Split one CSV line, keeping commas inside quoted fields (cube groupings)
+const splitCSVLine = (line) => {
+  const values = [];
+  let current = '';
+  let quoted = false;
+  for (const ch of line) {
+    if (ch === '"') {
+      quoted = !quoted;
+    } else if (ch === ',' && !quoted) {
+      values.push(current);
+      current = '';
+    } else {
+      current += ch;
+    }
+  }
+  values.push(current);
+  return values;
+};
+
 // Helper function to parse CSV string into array of objects
 const parseCSV = (csvString) => {
   if (!csvString || typeof csvString !== 'string') {
@@ -147,11 +188,11 @@ const parseCSV = (csvString) => {
     }
 
     // Clean headers (remove any \r characters)
-    const headers = lines[0].split(',').map(header => header.trim().replace(/\r/g, ''));
+    const headers = splitCSVLine(lines[0]).map(header => header.trim().replace(/\r/g, ''));
     console.log('CSV Headers:', headers);
     
     return lines.slice(1).map((line, index) => {
-      const values = line.split(',');
+      const values = splitCSVLine(line);
       if (values.length !== headers.length) {
         console.warn(`Line ${index + 1} has mismatched values:`, values);
       }
@@ -163,7 +204,8 @@ const parseCSV = (csvString) => {
         const value = values[index] ? values[index].trim().replace(/\r/g, '') : '';
         
         // Convert numeric values
-        if (['sla_breach_pct', 'avg_delivery_min', 'orders', 'revenue', 'total_items_sold', 'total_sales'].includes(header)) {
+        if (['sla_breach_pct', 'avg_delivery_min', 'orders', 'revenue', 'total_items_sold', 'total_sales',
+             'hour', 'delivered', 'delivery_min_sum', 'sla_breaches'].includes(header)) {
           obj[header] = parseFloat(value || '0');
         } else {
           obj[header] = value || '';
@@ -188,14 +230,8 @@ export const fetchLiveUpdate = async () => {
     console.log('No simulation data available, fetching new data');
     
     try {
-      // If we don't have simulation data yet, fetch it from the file
-      const response = await fetch('/data/kpi/kpi_delivery_daily.csv');
-      if (!response.ok) {
-        throw new Error('Failed to fetch simulation data');
-      }
-      
-      const csvText = await response.text();
-      const parsedData = parseCSV(csvText);
+      // If we don't have simulation data yet, fetch it from the cube
+      const parsedData = await fetchRollupCube(DAY_ZONE);
       
       // Only use second half of the data for simulation
       if (initialDataEndDate) {
@@ -314,7 +350,10 @@ export const aggregateSLABreachByZone = (data) => {
           slaBreachSum: 0,
           count: 0,
           orderSum: 0,
-          deliveryTimeSum: 0
+          deliveryTimeSum: 0,
+          breaches: 0,
+          delivered: 0,
+          deliveryMinSum: 0
         };
       }
       
@@ -332,13 +371,22 @@ export const aggregateSLABreachByZone = (data) => {
       zoneGroups[zone].count += 1;
       zoneGroups[zone].orderSum += orders;
       zoneGroups[zone].deliveryTimeSum += deliveryTime;
+      zoneGroups[zone].breaches += row.sla_breaches || 0;
+      zoneGroups[zone].delivered += row.delivered || 0;
+      zoneGroups[zone].deliveryMinSum += row.delivery_min_sum || 0;
     });
     
     // Calculate averages and format for visualization
     const result = Object.keys(zoneGroups).map(zone => {
       const group = zoneGroups[zone];
-      const avgBreachPct = (group.slaBreachSum / group.count) * 100;
-      const avgDeliveryTime = group.deliveryTimeSum / group.count;
+      // Cube rows carry sums, so the zone ratio is exact; older rows only
+      // have per-day percentages to average
+      const avgBreachPct = group.delivered > 0
+        ? (group.breaches / group.delivered) * 100
+        : (group.slaBreachSum / group.count) * 100;
+      const avgDeliveryTime = group.delivered > 0
+        ? group.deliveryMinSum / group.delivered
+        : group.deliveryTimeSum / group.count;
       
       // Use different colors for historical vs simulation data
       const fillColor = isSimulationData 
@@ -552,6 +600,7 @@ export const aggregateSLABreachByTimeOfDay = (data) => {
     timePeriods.forEach(period => {
       timeMap[period] = {
         totalOrders: 0,
+        deliveredOrders: 0,
         totalTime: 0,
         slaBreaches: 0,
         avgTimes: [] // Store all avg_delivery_min values for boxplot/distribution
@@ -577,10 +626,16 @@ export const aggregateSLABreachByTimeOfDay = (data) => {
       const isBreached = avgDeliveryMin > slaThreshold;
       
       timeMap[timePeriod].totalOrders += orders;
-      timeMap[timePeriod].totalTime += avgDeliveryMin * orders;
+      // Cube rows average over delivered orders only
+      const delivered = item.delivered !== undefined ? item.delivered : orders;
+      timeMap[timePeriod].totalTime += avgDeliveryMin * delivered;
+      timeMap[timePeriod].deliveredOrders += delivered;
       timeMap[timePeriod].avgTimes.push(avgDeliveryMin);
       
-      if (isBreached) {
+      // Cube rows count the breached orders; otherwise flag the whole row
+      if (item.sla_breaches !== undefined) {
+        timeMap[timePeriod].slaBreaches += item.sla_breaches;
+      } else if (isBreached) {
         timeMap[timePeriod].slaBreaches += orders;
       }
     });
@@ -588,11 +643,11 @@ export const aggregateSLABreachByTimeOfDay = (data) => {
     // Calculate stats and format data for chart
     return timePeriods.map(period => {
       const periodData = timeMap[period];
-      const avgTime = periodData.totalOrders > 0 
-        ? periodData.totalTime / periodData.totalOrders 
+      const avgTime = periodData.deliveredOrders > 0 
+        ? periodData.totalTime / periodData.deliveredOrders 
         : 0;
-      const breachPct = periodData.totalOrders > 0 
-        ? (periodData.slaBreaches / periodData.totalOrders) * 100 
+      const breachPct = periodData.deliveredOrders > 0 
+        ? (periodData.slaBreaches / periodData.deliveredOrders) * 100 
         : 0;
       
       // Calculate quartiles for boxplot
@@ -638,6 +693,7 @@ export const aggregateDriverZonePerformance = (data) => {
       if (!zoneMap[item.zone]) {
         zoneMap[item.zone] = {
           totalOrders: 0,
+          deliveredOrders: 0,
           totalTime: 0,
           slaBreaches: 0,
           avgDelay: 0,
@@ -659,11 +715,16 @@ export const aggregateDriverZonePerformance = (data) => {
       const delay = Math.max(0, avgDeliveryMin - slaThreshold);
       
       zoneMap[item.zone].totalOrders += orders;
-      zoneMap[item.zone].totalTime += avgDeliveryMin * orders;
+      // Cube rows average over delivered orders only
+      const delivered = item.delivered !== undefined ? item.delivered : orders;
+      zoneMap[item.zone].totalTime += avgDeliveryMin * delivered;
+      zoneMap[item.zone].deliveredOrders += delivered;
       zoneMap[item.zone].avgDelay = (zoneMap[item.zone].avgDelay * zoneMap[item.zone].dataPoints + delay) / (zoneMap[item.zone].dataPoints + 1);
       zoneMap[item.zone].dataPoints += 1;
       
-      if (avgDeliveryMin > slaThreshold) {
+      if (item.sla_breaches !== undefined) {
+        zoneMap[item.zone].slaBreaches += item.sla_breaches;
+      } else if (avgDeliveryMin > slaThreshold) {
         zoneMap[item.zone].slaBreaches += orders;
       }
     });
@@ -671,11 +732,11 @@ export const aggregateDriverZonePerformance = (data) => {
     // Format data for chart and sort by total orders
     return Object.keys(zoneMap).map(zone => {
       const zoneData = zoneMap[zone];
-      const avgTime = zoneData.totalOrders > 0 
-        ? zoneData.totalTime / zoneData.totalOrders 
+      const avgTime = zoneData.deliveredOrders > 0 
+        ? zoneData.totalTime / zoneData.deliveredOrders 
         : 0;
-      const breachPct = zoneData.totalOrders > 0 
-        ? (zoneData.slaBreaches / zoneData.totalOrders) * 100 
+      const breachPct = zoneData.deliveredOrders > 0 
+        ? (zoneData.slaBreaches / zoneData.deliveredOrders) * 100 
         : 0;
         
       return {
@@ -0,0 +1,170 @@
+# pipeline.py
+# Dependency-aware runner for the medallion pipeline. Every bronze->silver
+# loader and gold builder is a node with declared inputs and outputs (paths,
+# globs or table directories); a node depends on the nodes whose outputs it
+# reads. Nodes run on a thread pool as soon as their upstreams are done, and a
+# node is skipped when the content hash of its inputs (and of the module that
+# implements it) matches the last successful run and its outputs still exist.
+import os, json, glob, time, hashlib, inspect, argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import storage
+import bronze_to_silver as b2s
+import silver_to_gold as s2g
+import feature_store
+
+STATE = "woeat_demo/_pipeline.json"
+SILVER, GOLD, KPI = storage.SILVER, storage.GOLD, s2g.KPI
+
+class Node:
+    def __init__(self, name, fn, inputs, outputs, full_arg=False, code=None):
+        self.name = name
+        self.fn = fn
+        self.inputs = inputs
+        self.outputs = outputs
+        self.full_arg = full_arg       # fn takes full=... (rebuild instead of incremental)
+        self.code = code or inspect.getsourcefile(fn)   # editing it reruns the node
+
+def nodes(workers=1, chunk_size=None):
+    """The medallion DAG"""
+    return [
+        # bronze -> silver
+        Node("load_orders", lambda full: b2s.load_orders(full, workers),
+             ["woeat_demo/bronze*/orders_stream"], [f"{SILVER}/silver_orders", f"{storage.DICTS}/item_id.parquet"],
+             full_arg=True, code=b2s.__file__),
+        Node("load_restaurant_perf", b2s.load_restaurant_perf,
+             ["woeat_demo/bronze*/restaurant_reports"],
+             [f"{SILVER}/silver_restaurant_performance.parquet"], full_arg=True),
+        Node("load_menu_items", b2s.load_menu_items,
+             [f"{b2s.BRONZE}/menu_items"], [f"{SILVER}/silver_menu_items.parquet"]),
+        Node("load_drivers", b2s.load_drivers,
+             [f"{b2s.BRONZE}/drivers"], [f"{SILVER}/silver_drivers.parquet"]),
+        Node("load_weather", lambda full: b2s.load_weather(full, workers),
+             [f"{b2s.BRONZE}/weather_api"], [f"{SILVER}/silver_weather.parquet"],
+             full_arg=True, code=b2s.__file__),
+        # silver -> gold
+        Node("dim_restaurants", s2g.build_dim_restaurants,
+             [f"{SILVER}/silver_restaurant_performance.parquet", f"{SILVER}/silver_menu_items.parquet"],
+             [f"{GOLD}/dim_restaurants.csv", f"{GOLD}/_keys/restaurants.parquet"]),
+        Node("dim_drivers", s2g.build_dim_drivers,
+             [f"{SILVER}/silver_drivers.parquet"],
+             [f"{GOLD}/dim_drivers.csv", f"{GOLD}/_keys/drivers.parquet"]),
+        Node("dim_menu_items", s2g.build_dim_menu_items,
+             [f"{SILVER}/silver_menu_items.parquet", f"{GOLD}/dim_restaurants.csv"],
+             [f"{GOLD}/dim_menu_items.csv", f"{GOLD}/_keys/menu_items.parquet"]),
+        Node("facts", lambda full: s2g.build_facts(full, chunk_size),
+             [f"{SILVER}/silver_orders", f"{storage.DICTS}/item_id.parquet", f"{SILVER}/silver_menu_items.parquet",
+              f"{GOLD}/dim_drivers.csv", f"{GOLD}/dim_restaurants.csv", f"{GOLD}/_keys/menu_items.parquet"],
+             [f"{GOLD}/fact_orders", f"{GOLD}/fact_order_items", f"{GOLD}/agg_orders_cube.parquet",
+              f"{GOLD}/kpi_rollup_cube.parquet", f"{GOLD}/kpi_delivery_daily.csv",
+              f"{GOLD}/kpi_driver_performance_daily.csv", f"{KPI}/kpi_rollup_cube.csv",
+              f"{GOLD}/_keys/orders.parquet"], full_arg=True, code=s2g.__file__),
+        Node("ml_features", feature_store.update,
+             [f"{GOLD}/fact_orders", f"{GOLD}/dim_drivers.csv", f"{SILVER}/silver_weather.parquet"],
+             [f"{GOLD}/ml_delivery_features"], full_arg=True),
+        Node("synthetic_kpis", s2g.build_synthetic_kpis, [],
+             [f"{KPI}/{name}.csv" for name in ("kpi_delivery_daily", "kpi_driver_performance_daily",
+                                               "kpi_menu_item_sales", "kpi_cuisine_performance")]),
+    ]
+
+def upstreams(graph):
+    """node name -> names of the nodes producing one of its inputs"""
+    producers = {out: n.name for n in graph for out in n.outputs}
+    return {n.name: {producers[i] for i in n.inputs if i in producers and producers[i] != n.name}
+            for n in graph}
+
+# --- input fingerprints: sha1 per file, reused while size and mtime are unchanged ---
+def expand(patterns):
+    files = set()
+    for p in patterns:
+        for path in glob.glob(p):
+            if os.path.isdir(path):
+                files.update(os.path.join(d, f) for d, _, fs in os.walk(path) for f in fs)
+            else:
+                files.add(path)
+    return sorted(f for f in files if not f.endswith(".tmp"))
+
+def input_hash(node, cache):
+    """(hash over the node's input files and code, cache entries to update).
+    Runs on worker threads, so `cache` is only read here."""
+    h, updates = hashlib.sha1(), {}
+    for f in expand(node.inputs) + [node.code]:
+        st = os.stat(f)
+        entry = cache.get(f)
+        if not entry or entry["size"] != st.st_size or entry["mtime"] != st.st_mtime:
+            entry = updates[f] = {"size": st.st_size, "mtime": st.st_mtime, "sha1": b2s.file_hash(f)}
+        h.update(f.encode() + entry["sha1"].encode())
+    return h.hexdigest(), updates
+
+def load_state():
+    if not os.path.exists(STATE):
+        return {"nodes": {}, "files": {}}
+    with open(STATE) as fp:
+        return json.load(fp)
+
+def save_state(state):
+    tmp = STATE + ".tmp"
+    with open(tmp, "w") as fp:
+        json.dump(state, fp)
+    os.replace(tmp, STATE)
+
+def run(graph, full=False, parallel=4, only=None):
+    """Run the DAG; returns {node: (status, seconds)}"""
+    state = load_state()
+    deps = upstreams(graph)
+    by_name = {n.name: n for n in graph}
+    pending = {n.name for n in graph if only is None or n.name in only}
+    running, report = {}, {}
+
+    def execute(node):
+        t0 = time.perf_counter()
+        digest, updates = input_hash(node, state["files"])
+        fresh = all(expand([o]) for o in node.outputs)
+        if not full and fresh and state["nodes"].get(node.name) == digest:
+            return "skipped", time.perf_counter() - t0, None, updates
+        node.fn(full) if node.full_arg else node.fn()
+        return "ran", time.perf_counter() - t0, digest, updates
+
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        while pending or running:
+            for name in sorted(pending):
+                if not (deps[name] & (pending | set(running.values()))):
+                    pending.discard(name)
+                    running[pool.submit(execute, by_name[name])] = name
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                name = running.pop(fut)
+                try:
+                    status, seconds, digest, updates = fut.result()
+                except Exception as e:
+                    report[name] = ("failed", 0.0)
+                    print(f"✗ {name} failed: {e!r}")
+                    # downstream nodes cannot run on missing or stale inputs
+                    failed = {name}
+                    while blocked := {n for n in pending if deps[n] & failed}:
+                        pending -= blocked
+                        failed |= blocked
+                        report.update({n: ("blocked", 0.0) for n in blocked})
+                    continue
+                state["files"].update(updates)
+                if digest:
+                    state["nodes"][name] = digest
+                    save_state(state)
+                report[name] = (status, seconds)
+    state["files"] = {f: e for f, e in state["files"].items() if os.path.exists(f)}
+    save_state(state)
+    return report
+
+if __name__=="__main__":
+    ap = argparse.ArgumentParser(description="Run the bronze -> silver -> gold pipeline as a DAG")
+    ap.add_argument("--full", action="store_true", help="run every node as a full rebuild, skip nothing")
+    ap.add_argument("--parallel", type=int, default=4, help="nodes run at the same time")
+    ap.add_argument("--workers", type=int, default=1, help="processes used to parse order and weather files")
+    ap.add_argument("--chunk-size", type=int, help="rebuild the fact tables in batches of this many orders")
+    ap.add_argument("--only", nargs="*", help="run just these nodes")
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    report = run(nodes(args.workers, args.chunk_size), args.full, args.parallel, args.only and set(args.only))
+    print(f"\n{'node':<22}{'status':<9}{'seconds':>8}")
+    for name, (status, seconds) in report.items():
+        print(f"{name:<22}{status:<9}{seconds:>8.2f}")
+    print(f"✅ pipeline finished in {time.perf_counter()-t0:.2f}s")
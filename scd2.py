@@ -0,0 +1,94 @@
+# scd2.py
+# Type-2 slowly changing dimensions for the gold build. Every version of a
+# natural key is its own row with a surrogate key and a validity interval
+# [record_start_date, record_end_date); facts join the version that was
+# valid at their order_time.
+#
+# Version surrogate keys come from the dimension's KeyRegistry: the first
+# version of a natural ID is registered under the ID itself, later versions
+# under "<id>@<record_start_date>", so all versions share one key sequence.
+import numpy as np
+import pandas as pd
+
+SCD_START = "1900-01-01"      # first version of a key is valid from the start
+SCD_END = "9999-12-31"        # open end of the current version
+
+def attr_hash(df, tracked):
+    """uint64 hash of the tracked attributes of each row. Values are hashed as
+    text so a dimension read back from CSV hashes like the typed silver rows."""
+    return pd.util.hash_pandas_object(df[tracked].astype(str), index=False).to_numpy()
+
+def apply_scd2(dim, snapshot, natural, key, tracked, registry, as_of):
+    """Merge `snapshot` (latest attributes, one row per natural ID) into the
+    version history `dim` (None on the first build). Current rows whose
+    tracked-attribute hash differs are closed at `as_of` and a new version is
+    opened; new IDs get a first version; unchanged and missing IDs are left
+    alone. Returns (dim, number of changed IDs, number of new IDs)."""
+    snapshot = snapshot.drop_duplicates(natural, keep="last").reset_index(drop=True)
+    ids = snapshot[natural].astype(str)
+    if dim is None or dim.empty:
+        pos = np.full(len(snapshot), -1)
+        changed = np.zeros(len(snapshot), dtype=bool)
+        dim = None
+    else:
+        current = dim[dim["is_current"]]
+        pos = pd.Index(current[natural].astype(str)).get_indexer(ids)
+        changed = (pos >= 0) & (attr_hash(current, tracked)[pos] != attr_hash(snapshot, tracked))
+
+    start = pd.Timestamp(as_of).isoformat()
+    new = snapshot[pos == -1].copy()
+    new[key] = registry.assign(new[natural])
+    new["record_start_date"] = SCD_START
+    opened = snapshot[changed].copy()
+    opened[key] = registry.assign(ids[changed] + "@" + start)
+    opened["record_start_date"] = start
+    versions = pd.concat([new, opened], ignore_index=True)
+    versions["record_end_date"] = SCD_END
+    versions["is_current"] = True
+
+    if dim is None:
+        return versions, 0, len(new)
+    dim = dim.copy()
+    close = dim["is_current"] & dim[natural].astype(str).isin(ids[changed])
+    dim.loc[close, "record_end_date"] = start
+    dim.loc[close, "is_current"] = False
+    return pd.concat([dim, versions[dim.columns]], ignore_index=True), int(changed.sum()), len(new)
+
+def id_codes(values, ids):
+    """Position of each value in the pd.Index `ids`, -1 if absent; for a
+    categorical only its categories are hashed"""
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        pos = ids.get_indexer(values.cat.categories.astype(str))
+        codes = values.cat.codes.to_numpy()
+        return np.where(codes >= 0, pos[codes], -1)
+    return ids.get_indexer(values.astype(str).where(values.notna(), None))
+
+def lookup_as_of(dim, natural, key, ids, times):
+    """Surrogate key of the version of each ID valid at the matching time, as
+    an Int64 Series aligned with `ids`; <NA> for unknown or missing IDs. One
+    sorted as-of merge on integer ID codes, versions are never scanned per row."""
+    ids = pd.Series(ids)
+    known = pd.Index(pd.unique(dim[natural].astype(str)))
+    probe = pd.DataFrame({"code": id_codes(ids, known),
+                          "t": pd.to_datetime(pd.Series(times), utc=True).reset_index(drop=True),
+                          "row": np.arange(len(ids))})
+    probe = probe[(probe["code"] >= 0) & probe["t"].notna()].sort_values("t")
+    versions = pd.DataFrame({
+        "code": known.get_indexer(dim[natural].astype(str)),
+        "t": pd.to_datetime(dim["record_start_date"], utc=True, format="ISO8601"),
+        key: dim[key].astype("int64"),
+    }).sort_values("t")
+    joined = pd.merge_asof(probe, versions, on="t", by="code", direction="backward")
+    keys = pd.array(np.zeros(len(ids), dtype="int64"), dtype="Int64")
+    keys[:] = pd.NA
+    keys[joined["row"].to_numpy()] = joined[key].astype("Int64").to_numpy()
+    return pd.Series(keys, index=ids.index)
+
+def current_keys(dim, natural, key, ids):
+    """Surrogate key of the current version of each ID"""
+    current = dim[dim["is_current"]]
+    pos = id_codes(ids, pd.Index(current[natural].astype(str)))
+    keys = pd.array(current[key].to_numpy(dtype="int64")[pos], dtype="Int64")
+    keys[pos == -1] = pd.NA
+    return pd.Series(keys, index=pd.Series(ids).index)
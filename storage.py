@@ -0,0 +1,424 @@
+# storage.py
+# Typed columnar storage for the silver and gold layers. Tables are Parquet
+# files with explicit dtypes (categoricals for repeated IDs and status,
+# datetime64 for timestamps), so readers load only the columns they ask for
+# and never re-parse text. CSV is kept as an optional export.
+#
+# Order tables are partitioned by order date:
+#   <layer>/<table>/order_date=YYYY-MM-DD/part-0.parquet
+# and readers given a date range only open the matching partitions. A
+# partition written in batches (append_parts) holds part-0, part-1, ...
+#
+# ID lists (the items of an order) are stored as Arrow list<int32> columns:
+# one offsets array plus one flat array of codes from a shared, append-only
+# ID dictionary (silver/_dict), so readers never split text.
+import os, glob, shutil, threading
+from itertools import chain
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from key_registry import KeyRegistry
+
+SILVER = "woeat_demo/silver"
+GOLD = "woeat_demo/gold"
+EXPORT_CSV = os.environ.get("WOEAT_EXPORT_CSV") == "1"
+DICTS = f"{SILVER}/_dict"
+
+# table -> timestamp column whose UTC date names the partition
+PARTITIONED = {"silver_orders": "order_time", "fact_orders": "order_time",
+               "fact_order_items": "order_time", "ml_delivery_features": "order_time"}
+PARTITION_KEY = "order_date"
+
+# "datetime" = naive UTC, "datetime_utc" = tz-aware UTC
+SCHEMAS = {
+    "silver_orders": {
+        "order_id": "string",          # unique per row, a categorical would not shrink it
+        "customer_id": "category",
+        "restaurant_id": "category",
+        "driver_id": "category",
+        "items": "codes:item_id",      # list<int32> of item_id codes
+        "status": "category",
+        "order_time": "datetime_utc",
+        "delivery_time": "datetime_utc",
+        "ingest_timestamp": "datetime",
+    },
+    "silver_restaurant_performance": {
+        "report_date": "datetime",
+        "restaurant_id": "category",
+        "avg_prep_time": "int64",
+        "avg_rating": "float64",
+        "orders_count": "int64",
+        "cancel_rate": "float64",
+        "avg_tip": "float64",
+        "ingest_timestamp": "datetime",
+    },
+    "silver_menu_items": {
+        "item_id": "category",
+        "restaurant_id": "category",
+        "item_name": "string",
+        "category": "category",
+        "base_price": "float64",
+        "ingest_timestamp": "datetime",
+    },
+    "silver_drivers": {
+        "driver_id": "category",
+        "name": "string",
+        "rating": "float64",
+        "zone": "category",
+        "ingest_timestamp": "datetime",
+    },
+    "silver_weather": {
+        "zone": "category",
+        "weather_time": "datetime_utc",
+        "temperature": "float64",
+        "condition": "category",
+        "ingest_timestamp": "datetime",
+    },
+    "fact_orders": {
+        "order_key": "int64",
+        "order_id": "string",
+        "driver_key": "Int64",
+        "restaurant_key": "Int64",
+        "order_time": "datetime_utc",
+        "delivery_time": "datetime_utc",
+        "status": "category",
+        "total_amount": "float64",
+        "delivery_minutes": "float64",
+        "sla_breached": "bool",
+        "inserted_at": "datetime",
+    },
+    "fact_order_items": {
+        "order_item_key": "int64",
+        "order_key": "int64",
+        "menu_item_key": "Int64",
+        "quantity": "int64",
+        "extended_price": "float64",
+        "order_time": "datetime_utc",   # of the parent order, names the partition
+    },
+    "ml_delivery_features": {
+        "order_key": "int64",
+        "order_time": "datetime_utc",   # as-of time of the features
+        "distance_km": "float64",
+        "driver_rating": "float64",
+        "weather_condition": "category",
+        "time_of_day": "category",
+        "computed_at": "datetime",
+    },
+    "agg_orders_cube": {
+        "order_date": "string",
+        "hour": "int64",
+        "zone": "category",
+        "cuisine_type": "category",
+        "time_period": "category",
+        "orders": "int64",
+        "delivered": "int64",
+        "delivery_min_sum": "float64",
+        "sla_breaches": "int64",
+        "revenue": "float64",
+    },
+    "kpi_rollup_cube": {
+        "grouping": "category",
+        "order_date": "string",
+        "hour": "int64",
+        "zone": "category",
+        "cuisine_type": "category",
+        "time_period": "category",
+        "orders": "int64",
+        "delivered": "int64",
+        "delivery_min_sum": "float64",
+        "sla_breaches": "int64",
+        "revenue": "float64",
+    },
+}
+
+# --- shared ID dictionaries: an ID's code is its position in the dictionary ---
+DICT_LOCK = threading.Lock()
+
+def dictionary(domain):
+    """pd.Index of the IDs of a domain, in code order"""
+    return KeyRegistry(domain, DICTS).index
+
+def list_series(lists, codes):
+    """Arrow list<int32> Series shaped like the Series of lists `lists`"""
+    lengths = np.fromiter(map(len, lists), dtype="int64", count=len(lists))
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype("int32")
+    arr = pa.ListArray.from_arrays(pa.array(offsets), pa.array(codes.astype("int32")))
+    return pd.Series(pd.arrays.ArrowExtensionArray(arr), index=lists.index)
+
+def encode_lists(lists, domain):
+    """Arrow list<int32> Series of codes for a Series of ID lists; IDs not in
+    the domain dictionary yet are appended to it"""
+    lists = pd.Series(lists)
+    with DICT_LOCK:
+        registry = KeyRegistry(domain, DICTS)
+        codes = registry.assign(list(chain.from_iterable(lists))).to_numpy(dtype="int64") - 1
+        registry.save()
+    return list_series(lists, codes)
+
+def lookup_lists(lists, domain):
+    """encode_lists without touching the dictionary, for reads: every ID
+    must be in it already"""
+    lists = pd.Series(lists)
+    flat = pd.Index(list(chain.from_iterable(lists)), dtype=object)
+    codes = dictionary(domain).get_indexer(flat)
+    if (codes < 0).any():
+        missing = flat[codes < 0].unique()[:5].tolist()
+        raise ValueError(f"{domain} IDs not in the {domain} dictionary: {missing}; "
+                         f"rebuild the table with --full")
+    return list_series(lists, codes)
+
+def split_lists(text):
+    """ID lists of comma-joined text (legacy layout); missing values are empty lists"""
+    return pd.Series([s.split(",") if isinstance(s, str) and s else [] for s in text], index=text.index)
+
+def list_offsets(s):
+    """(offsets, flat codes) of an Arrow list Series: row i owns
+    codes[offsets[i]:offsets[i+1]]"""
+    offsets = np.concatenate([[0], np.cumsum(s.list.len().to_numpy(dtype="int64"))])
+    return offsets, s.list.flatten().to_numpy(dtype="int64")
+
+def decode_lists(s, domain):
+    """Comma-joined IDs of an Arrow list Series of codes (CSV export)"""
+    ids = dictionary(domain).to_numpy()
+    offsets, codes = list_offsets(s)
+    return pd.Series([",".join(ids[codes[a:b]]) for a, b in zip(offsets[:-1], offsets[1:])],
+                     index=s.index, dtype="string")
+
+def for_csv(df, table):
+    """df with ID lists decoded to the comma-joined text the CSV layout uses"""
+    lists = {col: kind[6:] for col, kind in SCHEMAS[table].items()
+             if kind.startswith("codes:") and col in df.columns}
+    return df.assign(**{col: decode_lists(df[col], domain) for col, domain in lists.items()})
+
+def cast(df, table, encode=False):
+    """Apply the table schema; columns not in the schema are left alone.
+    Legacy text ID lists are encoded, registering new IDs in the dictionary
+    only with encode=True (the write path); reads just look codes up."""
+    df = df.copy()
+    for col, kind in SCHEMAS[table].items():
+        if col not in df.columns:
+            continue
+        if kind == "datetime_utc":
+            df[col] = pd.to_datetime(df[col], utc=True)
+        elif kind == "datetime":
+            df[col] = pd.to_datetime(df[col], utc=True).dt.tz_localize(None)
+        elif kind.startswith("codes:"):
+            if not isinstance(df[col].dtype, pd.ArrowDtype):   # legacy comma-joined text
+                df[col] = (encode_lists if encode else lookup_lists)(split_lists(df[col]), kind[6:])
+        else:
+            df[col] = df[col].astype(kind)
+    return df
+
+def table_path(table, ext="parquet"):
+    """Flat file for plain tables, directory of partitions for PARTITIONED ones"""
+    layer = SILVER if table.startswith("silver_") else GOLD
+    if table in PARTITIONED and ext == "parquet":
+        return os.path.join(layer, table)
+    return os.path.join(layer, f"{table}.{ext}")
+
+def table_exists(table):
+    return os.path.exists(table_path(table)) or os.path.exists(table_path(table, "csv"))
+
+def partition_dates(df, table):
+    """YYYY-MM-DD partition value of every row"""
+    return pd.to_datetime(df[PARTITIONED[table]], utc=True).dt.strftime("%Y-%m-%d")
+
+def partitions(table, start=None, end=None, dates=None):
+    """{date: partition dir} of a partitioned table, pruned by an inclusive
+    [start, end] range and/or an explicit set of dates"""
+    start = start and pd.Timestamp(start).strftime("%Y-%m-%d")
+    end = end and pd.Timestamp(end).strftime("%Y-%m-%d")
+    found = {}
+    for d in glob.glob(os.path.join(table_path(table), f"{PARTITION_KEY}=*")):
+        date = d.rsplit("=", 1)[1]
+        if (start and date < start) or (end and date > end) or (dates is not None and date not in dates):
+            continue
+        found[date] = d
+    return dict(sorted(found.items()))
+
+def part_files(partition_dir):
+    """part-N.parquet files of a partition, in N order"""
+    files = glob.glob(os.path.join(partition_dir, "part-*.parquet"))
+    return sorted(files, key=lambda f: int(os.path.basename(f)[5:-8]))
+
+def latest_partition(table):
+    found = partitions(table)
+    return max(found) if found else None
+
+def write_atomic_parquet(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+def write_table(df, table, export_csv=None, replace=True):
+    """Write a table. For partitioned tables each date in df replaces its
+    partition; with replace=True df is the whole table and partitions that
+    are not in it are removed, with replace=False other partitions are kept."""
+    df = cast(df, table, encode=True)
+    if table in PARTITIONED:
+        root = table_path(table)
+        keys = partition_dates(df, table)
+        for date, part in df.groupby(keys, sort=True):
+            write_atomic_parquet(part, os.path.join(root, f"{PARTITION_KEY}={date}", "part-0.parquet"))
+            drop_parts(table, date, 1)
+        if replace:
+            prune_partitions(table, set(keys))
+        flat = os.path.join(os.path.dirname(root), f"{table}.parquet")
+        if os.path.exists(flat):                # pre-partitioning layout
+            os.remove(flat)
+    else:
+        write_atomic_parquet(df, table_path(table))
+    if EXPORT_CSV if export_csv is None else export_csv:
+        full = df if replace or table not in PARTITIONED else read_table(table)
+        for_csv(full, table).to_csv(table_path(table, "csv"), index=False)
+    return df
+
+def append_parts(df, table, parts):
+    """Write the rows of each date in df as the next part file of its
+    partition; `parts` ({date: part files written so far}) is updated.
+    Finish a batched write with drop_parts / prune_partitions."""
+    df = cast(df, table, encode=True)
+    for date, rows in df.groupby(partition_dates(df, table), sort=True):
+        n = parts.get(date, 0)
+        write_atomic_parquet(rows, os.path.join(table_path(table), f"{PARTITION_KEY}={date}",
+                                                f"part-{n}.parquet"))
+        parts[date] = n + 1
+    return df
+
+def append_table(df, table, max_parts=8):
+    """Append rows to a partitioned table as new part files. A partition that
+    reaches max_parts files is compacted back into a single part-0."""
+    parts = {date: len(part_files(d)) for date, d in partitions(table).items()}
+    df = append_parts(df, table, parts)
+    full = {date for date in set(partition_dates(df, table)) if parts[date] >= max_parts}
+    if full:
+        write_table(read_table(table, dates=full), table, replace=False)
+    return df
+
+def drop_parts(table, date, keep):
+    """Remove part files of a partition from part-`keep` on"""
+    for f in part_files(os.path.join(table_path(table), f"{PARTITION_KEY}={date}"))[keep:]:
+        os.remove(f)
+
+def prune_partitions(table, dates):
+    """Remove the partitions whose date is not in `dates`"""
+    for date, d in partitions(table).items():
+        if date not in dates:
+            shutil.rmtree(d)
+
+def write_silver(df, table, export_csv=None, replace=True):
+    return write_table(df, table, export_csv, replace)
+
+def write_gold(df, table, export_csv=None, replace=True):
+    return write_table(df, table, export_csv, replace)
+
+OPS = {
+    "==": lambda s, v: s == v, "!=": lambda s, v: s != v,
+    "<": lambda s, v: s < v, "<=": lambda s, v: s <= v,
+    ">": lambda s, v: s > v, ">=": lambda s, v: s >= v,
+    "in": lambda s, v: s.isin(v), "not in": lambda s, v: ~s.isin(v),
+}
+
+def apply_filters(df, filters):
+    for col, op, value in filters or []:
+        df = df[OPS[op](df[col], value)]
+    return df.reset_index(drop=True)
+
+def to_pandas(arrow):
+    """Arrow table/batch -> DataFrame. List columns stay Arrow-backed; the
+    other dtypes come from the schema (cast), not the stored pandas metadata"""
+    return arrow.to_pandas(ignore_metadata=True,
+                           types_mapper=lambda t: pd.ArrowDtype(t) if pa.types.is_list(t) else None)
+
+def read_parquet(path, columns=None, filters=None):
+    return to_pandas(pq.read_table(path, columns=columns, filters=filters or None))
+
+def concat(frames):
+    """pd.concat of part frames; categoricals keep the union of the parts'
+    categories instead of falling back to object"""
+    for col in frames[0].columns:
+        if len(frames) > 1 and any(isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames):
+            parts = [f[col].astype("category") for f in frames]
+            cats = parts[0].cat.categories
+            for p in parts[1:]:
+                cats = cats.union(p.cat.categories)
+            frames = [f.assign(**{col: pd.Categorical(p, categories=cats)}) for f, p in zip(frames, parts)]
+    return pd.concat(frames, ignore_index=True)
+
+def read_table(table, columns=None, filters=None, start=None, end=None, dates=None):
+    """Read a table. `columns` limits what is loaded; `filters` is a list of
+    (column, op, value) tuples, pushed down into Parquet row groups. For
+    partitioned tables `start`/`end` (inclusive) and `dates` prune partitions
+    before anything is opened. Falls back to a legacy flat Parquet/CSV file."""
+    path = table_path(table)
+    if table in PARTITIONED and os.path.isdir(path):
+        frames = [read_parquet(f, columns, filters)
+                  for d in partitions(table, start, end, dates).values() for f in part_files(d)]
+        if not frames:
+            return cast(pd.DataFrame(columns=columns or list(SCHEMAS[table])), table)
+        return cast(concat(frames), table)
+    flat = os.path.join(os.path.dirname(path), f"{table}.parquet") if table in PARTITIONED else path
+    if os.path.exists(flat):
+        df = cast(read_parquet(flat, columns, filters), table)
+    else:
+        df = cast(pd.read_csv(table_path(table, "csv")), table)
+        df = df[columns] if columns else df
+        df = apply_filters(df, filters)
+    if table in PARTITIONED and (start or end or dates is not None):
+        key = partition_dates(df, table) if PARTITIONED[table] in df else None
+        if key is not None:
+            keep = pd.Series(True, index=df.index)
+            if start: keep &= key >= pd.Timestamp(start).strftime("%Y-%m-%d")
+            if end: keep &= key <= pd.Timestamp(end).strftime("%Y-%m-%d")
+            if dates is not None: keep &= key.isin(list(dates))
+            df = df[keep].reset_index(drop=True)
+    return df
+
+def table_files(table, start=None, end=None, dates=None):
+    """Files read_table opens for these partition bounds, in read order"""
+    path = table_path(table)
+    if table in PARTITIONED and os.path.isdir(path):
+        return [f for d in partitions(table, start, end, dates).values() for f in part_files(d)]
+    flat = os.path.join(os.path.dirname(path), f"{table}.parquet") if table in PARTITIONED else path
+    return [flat] if os.path.exists(flat) else [table_path(table, "csv")]
+
+def file_version(paths):
+    """(path, size, mtime_ns) of the files that exist. Every write is an
+    atomic replace, so a rewritten file always changes its entry."""
+    version = []
+    for f in paths:
+        try:
+            st = os.stat(f)
+        except FileNotFoundError:
+            continue
+        version.append((f, st.st_size, st.st_mtime_ns))
+    return tuple(version)
+
+def table_version(table, start=None, end=None, dates=None):
+    """Changes whenever read_table with the same bounds could return
+    something else; cheap (stat calls only)"""
+    return file_version(table_files(table, start, end, dates))
+
+def legacy_lists(table):
+    """True if the table still stores ID lists as comma-joined text (written
+    before the ID dictionaries); reading it needs the IDs in the dictionary"""
+    lists = [col for col, kind in SCHEMAS[table].items() if kind.startswith("codes:")]
+    files = [f for f in table_files(table) if f.endswith(".parquet") and os.path.exists(f)]
+    if not lists or not files:
+        return False
+    schema = pq.read_schema(files[0])
+    return any(col in schema.names and not pa.types.is_list(schema.field(col).type) for col in lists)
+
+def iter_table(table, columns=None, chunk_size=100_000):
+    """Read a Parquet table as DataFrames of at most chunk_size rows, in the
+    row order read_table returns (partitions by date, then parts)"""
+    for f in table_files(table):
+        for batch in pq.ParquetFile(f).iter_batches(batch_size=chunk_size, columns=columns):
+            yield cast(to_pandas(batch), table)
+
+def read_silver(table, columns=None, filters=None, start=None, end=None, dates=None):
+    return read_table(table, columns, filters, start, end, dates)
+
+def read_gold(table, columns=None, filters=None, start=None, end=None, dates=None):
+    return read_table(table, columns, filters, start, end, dates)
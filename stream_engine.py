@@ -0,0 +1,270 @@
+# stream_engine.py
+# Micro-batch streaming mode for bronze_live. Instead of a batch rebuild per
+# live order, one long-running process tails bronze_live/orders_stream
+# (byte offsets into the NDJSON segments, so only appended lines are read)
+# and keeps silver and gold state in memory:
+#   - silver_orders, fact_orders and fact_order_items of the dates the
+#     stream touches (loaded once from disk, then updated in place)
+#   - the open (not yet delivered) orders
+#   - the running order KPI state (agg_orders_cube)
+# Every micro-batch is applied as a delta: orders are upserted by status
+# progression, fact rows are recomputed for the changed orders only and the
+# KPI state gets +new -replaced contributions. State is flushed to the
+# silver/gold tables, checkpoints and KPI files on a checkpoint interval, so
+# the batch ETL can pick up where the stream left off. While streaming, the
+# engine must be the only writer of orders: the live dashboard's stream mode
+# (WOEAT_STREAM=1) runs it next to an ETL worker that skips the order nodes;
+# do not run a full pipeline.py on the same tree meanwhile.
+import os, json, time, argparse
+import pandas as pd
+import storage
+import bronze_to_silver as b2s
+import silver_to_gold as s2g
+import kpi_aggregates
+import feature_store
+import pipeline
+from storage import read_silver, read_gold, write_silver, write_gold, partition_dates
+from key_registry import KeyRegistry
+from bronze_segments import read_records, live_files
+
+LIVE = "woeat_demo/bronze_live/orders_stream"
+INTERVAL = 0.2        # seconds between micro-batches
+FLUSH_EVERY = 5.0     # seconds between checkpoints to disk
+
+def status_rank(status):
+    return status.astype(str).map(b2s.STATUS_ORDER).fillna(0).to_numpy()
+
+def upsert(old, new, key):
+    """old with the rows of new replacing those with the same key"""
+    if old is None or old.empty:
+        return new.reset_index(drop=True)
+    frames = [f for f in (old[~old[key].isin(new[key])], new) if len(f)]
+    return pd.concat(frames, ignore_index=True) if frames else old.iloc[:0]
+
+class StreamEngine:
+    def __init__(self, interval=INTERVAL, flush_every=FLUSH_EVERY):
+        self.interval = interval
+        self.flush_every = flush_every
+        # bring silver and gold up to date once, then continue from the checkpoints
+        pipeline.run(pipeline.nodes())
+        seen = b2s.load_checkpoint().get("orders", {})
+        self.offsets = {f: e["size"] for f, e in seen.items() if f.startswith(LIVE)}
+        self.folders, self.files = None, []     # live partitions (path, mtime) -> their files
+        self.cp = s2g.load_checkpoint()
+        self.order_keys = KeyRegistry("orders")
+        self.load_lookups()
+        agg = read_gold("agg_orders_cube") if storage.table_exists("agg_orders_cube") else None
+        if agg is None or not self.cp.get("kpis_consistent"):
+            agg = kpi_aggregates.apply_delta(None, self.contributions(read_gold("fact_orders")))
+        self.agg = agg
+        self.silver, self.facts, self.items = {}, {}, {}     # date -> DataFrame
+        self.itemized = set()          # order_keys whose items are in fact_order_items
+        self.open_orders = set()       # order_ids placed but not delivered yet
+        self.dirty = set()             # dates changed since the last flush
+        self.consumed = {}             # file -> mtime of the version read to its end
+        self.watermark = None
+        self.stats = {"batches": 0, "orders": 0, "updates": 0, "flushes": 0, "last_batch_s": 0.0, "lag_s": 0.0}
+        self.last_flush = time.monotonic()
+
+    # --- resident lookups ---
+    def load_lookups(self):
+        self.dim_drivers = s2g.read_dim("dim_drivers")
+        self.dim_restaurants = s2g.read_dim("dim_restaurants")
+        self.dims_mtime = self.dim_mtimes()
+        self.contributions = s2g.kpi_contributions(self.dim_drivers, self.dim_restaurants)
+        self.menus = read_silver("silver_menu_items", columns=["item_id", "base_price"])
+        self.key_by_code, self.price_by_code = s2g.item_lookups(KeyRegistry("menu_items"), self.menus)
+
+    def dim_mtimes(self):
+        return [os.path.getmtime(f"{s2g.GOLD}/{d}.csv") for d in ("dim_drivers", "dim_restaurants")]
+
+    def ensure_dates(self, dates):
+        """Load the silver and fact partitions of dates not in memory yet"""
+        for date in set(dates) - set(self.silver):
+            self.silver[date] = read_silver("silver_orders", dates={date})
+            self.facts[date] = read_gold("fact_orders", dates={date})
+            self.items[date] = read_gold("fact_order_items", dates={date})
+            self.itemized.update(self.items[date]["order_key"])
+            silver = self.silver[date]
+            self.open_orders.update(silver.loc[silver["status"].astype(str) == "PLACED", "order_id"].astype(str))
+
+    # --- tailing ---
+    def tail_files(self):
+        """Files of the live partitions in b2s.order_files() order. A folder's
+        mtime changes when a segment or manifest is added or removed, so the
+        list is only rebuilt then; appends are picked up by poll's stat."""
+        try:
+            folders = [(e.path, e.stat().st_mtime_ns) for e in os.scandir(LIVE) if e.is_dir()]
+        except FileNotFoundError:
+            folders = []
+        folders.sort()
+        if folders != self.folders:
+            self.folders = folders
+            self.files = [f for folder, _ in folders for f in live_files(folder, ["*.json", "*.ndjson"])]
+        return self.files
+
+    def poll(self):
+        """Records appended to the live segments since the last poll, as
+        append_order column lists"""
+        cols = {c: [] for c in b2s.ORDER_COLUMNS}
+        newest = None
+        for f in self.tail_files():
+            try:
+                st = os.stat(f)
+            except FileNotFoundError:          # compacted away meanwhile
+                continue
+            start = self.offsets.get(f, 0)
+            if st.st_size <= start:
+                continue
+            if f.endswith(".ndjson"):
+                # only the appended bytes; a trailing partial line is not done yet
+                with open(f, "rb") as fp:
+                    fp.seek(start)
+                    data = fp.read(st.st_size - start)
+                data = data[:data.rfind(b"\n") + 1]
+                records = [json.loads(line) for line in data.decode().splitlines() if line.strip()]
+                self.offsets[f] = start + len(data)
+            else:                      # legacy one-order .json, compacted .gz: whole file
+                records = list(read_records(f))
+                self.offsets[f] = st.st_size
+            for rec in records:
+                b2s.append_order(cols, rec, st.st_mtime)
+            if self.offsets[f] == st.st_size:
+                self.consumed[f] = st.st_mtime
+            newest = max(newest or 0, st.st_mtime)
+        return cols, newest
+
+    # --- one micro-batch ---
+    def apply(self, cols):
+        """Apply parsed records as a delta; returns the orders upserted"""
+        new = b2s.merge_orders(None, b2s.order_frame(cols))
+        dates = partition_dates(new, "silver_orders")
+        self.ensure_dates(dates.unique())
+        changed, added = [], 0
+        for date, rows in new.groupby(dates.to_numpy(), sort=True):
+            old = self.silver[date]
+            # status progression: a row never replaces one that is further along
+            prev = old.set_index("order_id")["status"].astype(object).reindex(rows["order_id"].astype(str))
+            keep = (status_rank(rows["status"]) >= status_rank(prev.fillna("PLACED"))) | prev.isna().to_numpy()
+            rows = rows[keep]
+            added += int(prev.isna().to_numpy()[keep].sum())
+            if len(rows):
+                self.silver[date] = upsert(old, rows, "order_id")
+                changed.append(rows)
+                self.dirty.add(date)
+        if not changed:
+            return 0
+        orders = pd.concat(changed, ignore_index=True)
+        # a PLACED line and its later DELIVERED line are one order and one update
+        self.stats["orders"] += added
+        self.stats["updates"] += len(orders) - added
+        placed = orders["status"].astype(str) == "PLACED"
+        self.open_orders.update(orders.loc[placed, "order_id"].astype(str))
+        self.open_orders.difference_update(orders.loc[~placed, "order_id"].astype(str))
+        self.order_keys.assign(orders["order_id"])
+        if int(storage.list_offsets(orders["items"])[1].max(initial=-1)) >= len(self.key_by_code):
+            self.key_by_code, self.price_by_code = s2g.item_lookups(KeyRegistry("menu_items"), self.menus)
+
+        items = s2g.order_item_rows(orders, self.order_keys, self.key_by_code, self.price_by_code)
+        facts = s2g.order_rows(orders, self.order_keys, self.dim_drivers, self.dim_restaurants, items)
+        # items never change after an order is placed: only first-seen orders add lines
+        fresh = items[~items["order_key"].isin(self.itemized)].copy()
+        fresh["order_item_key"] = s2g.item_keys(fresh)
+        self.itemized.update(fresh["order_key"])
+
+        replaced = []
+        for date, rows in facts.groupby(partition_dates(facts, "fact_orders").to_numpy(), sort=True):
+            old = self.facts[date]
+            replaced.append(old[old["order_key"].isin(rows["order_key"])])
+            self.facts[date] = upsert(old, rows, "order_key")
+        for date, rows in fresh.groupby(partition_dates(fresh, "fact_order_items").to_numpy(), sort=True):
+            self.items[date] = upsert(self.items[date], rows[s2g.ITEM_COLUMNS], "order_item_key")
+        replaced = pd.concat(replaced, ignore_index=True)
+        self.agg = kpi_aggregates.apply_delta(self.agg, self.contributions(facts),
+                                              self.contributions(replaced) if len(replaced) else None)
+        batch_max = orders["ingest_timestamp"].max()
+        self.watermark = batch_max if self.watermark is None else max(self.watermark, batch_max)
+        return len(orders)
+
+    def step(self):
+        """Poll and apply one micro-batch; flush when the interval is due"""
+        t0 = time.perf_counter()
+        cols, newest = self.poll()
+        n = self.apply(cols) if cols["order_id"] else 0
+        if n:
+            self.stats["batches"] += 1
+            self.stats["last_batch_s"] = time.perf_counter() - t0
+            self.stats["lag_s"] = time.time() - newest
+        if time.monotonic() - self.last_flush >= self.flush_every:
+            self.flush()
+        return n
+
+    # --- checkpoint to disk ---
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if self.dirty:
+            dates = sorted(self.dirty)
+            write_silver(pd.concat([self.silver[d] for d in dates], ignore_index=True),
+                         "silver_orders", replace=False)
+            self.cp["kpis_consistent"] = False
+            s2g.save_checkpoint(self.cp)
+            write_gold(pd.concat([self.items[d] for d in dates], ignore_index=True),
+                       "fact_order_items", replace=False)
+            write_gold(pd.concat([self.facts[d] for d in dates], ignore_index=True),
+                       "fact_orders", replace=False)
+            self.order_keys.save()
+            # the batch ETL treats the consumed segment versions as parsed
+            seen = b2s.load_checkpoint().get("orders", {})
+            for f, mtime in self.consumed.items():
+                if os.path.exists(f) and os.path.getmtime(f) == mtime:
+                    st = os.stat(f)
+                    seen[f] = {"size": st.st_size, "mtime": st.st_mtime, "sha1": b2s.file_hash(f)}
+            b2s.save_checkpoint("orders", seen)
+            self.consumed.clear()
+            if self.watermark is not None:
+                old = self.cp.get("orders_watermark")
+                self.cp["orders_watermark"] = str(max(self.watermark, pd.Timestamp(old)) if old else self.watermark)
+            s2g.write_order_kpis(self.agg, self.cp, "streamed")
+            feature_store.update()
+            self.dirty.clear()
+            self.stats["flushes"] += 1
+        if self.dim_mtimes() != self.dims_mtime:     # dimensions rebuilt by the batch ETL
+            self.load_lookups()
+
+    def kpis(self):
+        """Current kpi_delivery_daily, straight from the in-memory state"""
+        return kpi_aggregates.kpi_delivery_daily(self.agg)
+
+    def run(self, duration=None, stop=None):
+        """Micro-batch loop until `duration` seconds pass or `stop` (a
+        threading.Event) is set; flushes on the way out"""
+        end = None if duration is None else time.monotonic() + duration
+        report = time.monotonic()
+        try:
+            while not (stop is not None and stop.is_set()) and (end is None or time.monotonic() < end):
+                if not self.step():
+                    time.sleep(self.interval)
+                if time.monotonic() - report >= 10:
+                    report = time.monotonic()
+                    print(f"✓ stream: {self.stats['orders']} orders, {self.stats['updates']} status updates "
+                          f"in {self.stats['batches']} batches, "
+                          f"{len(self.open_orders)} open, last batch {self.stats['last_batch_s']*1000:.0f} ms, "
+                          f"lag {self.stats['lag_s']:.2f}s")
+        finally:
+            self.flush()
+
+if __name__=="__main__":
+    ap = argparse.ArgumentParser(description="Stream bronze_live orders into silver/gold in micro-batches")
+    ap.add_argument("--interval", type=float, default=INTERVAL, help="seconds between polls when idle")
+    ap.add_argument("--flush", type=float, default=FLUSH_EVERY, help="seconds between checkpoints to disk")
+    ap.add_argument("--duration", type=float, help="stop after this many seconds")
+    args = ap.parse_args()
+    engine = StreamEngine(args.interval, args.flush)
+    print(f"✅ streaming {LIVE} (Ctrl+C to stop)")
+    try:
+        engine.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    print(f"✅ stream stopped: {engine.stats['orders']} orders, {engine.stats['updates']} status updates "
+          f"in {engine.stats['batches']} batches, "
+          f"{engine.stats['flushes']} flushes")
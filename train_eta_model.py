@@ -1,4 +1,3 @@
-import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.compose import ColumnTransformer
@@ -6,9 +5,10 @@ from sklearn.pipeline import Pipeline
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error
 import joblib
+import feature_store
 
-# Load your feature data
-df = pd.read_csv("woeat_demo/gold/ml_delivery_features.csv")
+# Load your feature data (point-in-time features + delivery_minutes label)
+df = feature_store.training_set()
 
 # 🧹 Drop rows with missing target values
 df = df.dropna(subset=["delivery_minutes"])